@@ -0,0 +1,21 @@
+from .extract import iter_pages, text_formatter
+from .chunk import chunk_pages, split_sentences
+from .bm25 import BM25Index, tokenize
+from .ingest import Ingester, SegmentedIndex
+
+# dense.py needs numpy, so it is only imported when one of its names is used.
+DENSE = {"DenseIndex", "EmbeddingCache", "HashingEmbedder", "SentenceTransformerEmbedder", "make_embedder"}
+
+
+def __getattr__(name):
+    if name in DENSE:
+        from . import dense
+        return getattr(dense, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "iter_pages", "text_formatter", "chunk_pages", "split_sentences", "BM25Index", "tokenize",
+    "DenseIndex", "EmbeddingCache", "HashingEmbedder", "SentenceTransformerEmbedder", "make_embedder",
+    "Ingester", "SegmentedIndex",
+]
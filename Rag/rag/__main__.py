@@ -0,0 +1,137 @@
+import sys
+import json
+import time
+import argparse
+from itertools import chain
+from pathlib import Path
+
+from .extract import iter_pages
+from .chunk import chunk_pages
+from .bm25 import BM25Index
+from .ingest import MANIFEST, Ingester, SegmentedIndex
+
+
+def iter_chunks(args):
+    return chain.from_iterable(
+        chunk_pages(iter_pages(doc), args.sentences, args.overlap, args.min_tokens, source=str(doc))
+        for doc in args.documents
+    )
+
+
+def load_dense():
+    # Imported on demand so the BM25 commands work without numpy.
+    try:
+        from . import dense
+    except ImportError as e:
+        raise RuntimeError("Dense retrieval needs numpy (pip install numpy)") from e
+    return dense
+
+
+def open_index(path):
+    if (path / MANIFEST).exists():
+        return SegmentedIndex(path)
+    try:
+        kind = json.loads((path / "meta.json").read_text()).get("kind", "bm25")
+    except (OSError, ValueError):
+        kind = "bm25"
+    if kind == "dense":
+        return load_dense().DenseIndex(path)
+    return BM25Index(path)
+
+
+def cmd_index(args):
+    start = time.perf_counter()
+    index = BM25Index.build(iter_chunks(args), args.output)
+    print(f"Indexed {len(index)} chunks into {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_embed(args):
+    dense = load_dense()
+    embedder = dense.make_embedder(args.embedder) if args.embedder else dense.HashingEmbedder(args.dim)
+    start = time.perf_counter()
+    index = dense.DenseIndex.build(iter_chunks(args), args.output, embedder, cache_dir=args.cache, batch_size=args.batch_size)
+    print(f"Embedded {len(index)} chunks with {embedder.name} into {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_ingest(args):
+    ingester = Ingester(args.directory, args.output, args.workers, args.sentences, args.overlap, args.min_tokens,
+                        merge_factor=args.merge_factor)
+
+    def report(stats):
+        print(f"{stats['scanned']} files: {stats['changed']} indexed ({stats['chunks']} chunks), "
+              f"{stats['unchanged']} unchanged, {stats['removed']} removed, {stats['errors']} failed; "
+              f"{stats['segments']} segments ({stats['merged']} merged) in {stats['seconds']:.2f}s", flush=True)
+
+    if args.watch:
+        try:
+            ingester.watch(args.interval, report)
+        except KeyboardInterrupt:
+            pass
+    else:
+        report(ingester.run())
+
+
+def cmd_search(args):
+    index = open_index(args.index)
+    start = time.perf_counter()
+    results = index.search(args.query, args.k)
+    elapsed = (time.perf_counter() - start) * 1000
+    for score, chunk in results:
+        print(f"{score:7.3f}  {chunk['source']} p.{chunk['page_number']}  {chunk['sentence_chunk'][:160]}")
+    print(f"{len(results)} results in {elapsed:.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rag", description="Local retrieval over documents.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_chunk_options(p, documents=True):
+        if documents:
+            p.add_argument("documents", nargs="+", type=Path)
+        p.add_argument("--sentences", type=int, default=10, help="sentences per chunk")
+        p.add_argument("--overlap", type=int, default=0, help="sentences shared by consecutive chunks")
+        p.add_argument("--min-tokens", type=int, default=30, help="drop chunks this short or shorter")
+
+    p = sub.add_parser("index", help="build a BM25 index from PDF or text documents")
+    add_chunk_options(p)
+    p.add_argument("-o", "--output", type=Path, default=Path("index"))
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser("embed", help="build a dense (embedding) index from PDF or text documents")
+    add_chunk_options(p)
+    p.add_argument("-o", "--output", type=Path, default=Path("vectors"))
+    p.add_argument("--embedder", help="e.g. st:all-mpnet-base-v2 (default: offline hashing embedder)")
+    p.add_argument("--dim", type=int, default=384, help="hashing embedder dimensions")
+    p.add_argument("--cache", type=Path, default=Path(".embedding-cache"), help="embedding cache directory")
+    p.add_argument("--batch-size", type=int, default=64)
+    p.set_defaults(func=cmd_embed)
+
+    p = sub.add_parser("ingest", help="incrementally index a directory of documents, in parallel")
+    p.add_argument("directory", type=Path)
+    add_chunk_options(p, documents=False)
+    p.add_argument("-o", "--output", type=Path, default=Path("index"))
+    p.add_argument("-j", "--workers", type=int, help="worker processes (default: one per CPU)")
+    p.add_argument("--merge-factor", type=int, default=10, help="merge this many similar-size segments into one")
+    p.add_argument("--watch", action="store_true", help="keep rescanning the directory")
+    p.add_argument("--interval", type=float, default=2.0, help="seconds between rescans with --watch")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("search", help="query an index")
+    p.add_argument("index", type=Path)
+    p.add_argument("query")
+    p.add_argument("-k", type=int, default=5)
+    p.set_defaults(func=cmd_search)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "merge_factor", 2) < 2:
+        parser.error("--merge-factor must be at least 2")
+    try:
+        args.func(args)
+    except (RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
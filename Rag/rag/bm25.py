@@ -0,0 +1,230 @@
+import re
+import sys
+import json
+import math
+import heapq
+import shutil
+from array import array
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Iterable
+
+from .storage import map_file, temp_dir_for, replace_dir, DocWriter, DocReader
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her his i if in into is it its of on or "
+    "she so that the their them then there they this to was were will with you".split()
+)
+FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over chunks, stored as flat arrays that are memory-mapped on open.
+
+    Files in the index directory:
+
+    - ``terms.bin`` / ``terms.idx``: vocabulary sorted by UTF-8 bytes and its
+      byte offsets (uint64), searched with binary search
+    - ``postings.idx``: start of each term's postings (uint64, one per term + 1)
+    - ``docids.bin`` / ``tfs.bin``: postings, doc ids and term frequencies (uint32)
+    - ``norms.bin``: per-document ``k1 * (1 - b + b * dl / avgdl)`` (float32)
+    - ``lens.bin``: per-document length ``dl`` in tokens (uint32), used by ``merge``
+      and by ``normalized``
+    - ``docs.jsonl`` / ``docs.idx``: the chunks themselves and their offsets (see storage.py)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.meta = json.loads((self.path / "meta.json").read_text())
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Not a BM25 index: {self.path}: {e}")
+        if self.meta.get("kind", "bm25") != "bm25" or self.meta.get("version") != FORMAT_VERSION \
+                or self.meta.get("byteorder") != sys.byteorder:
+            raise RuntimeError(f"Incompatible BM25 index format in {self.path}")
+        self.k1 = self.meta["k1"]
+        self.num_docs = self.meta["num_docs"]
+        self.terms = map_file(self.path / "terms.bin")
+        self.term_offsets = map_file(self.path / "terms.idx", "Q")
+        self.postings = map_file(self.path / "postings.idx", "Q")
+        self.doc_ids = map_file(self.path / "docids.bin", "I")
+        self.tfs = map_file(self.path / "tfs.bin", "I")
+        self.norms = map_file(self.path / "norms.bin", "f")
+        self.lens = map_file(self.path / "lens.bin", "I") if (self.path / "lens.bin").exists() else None
+        self.docs = DocReader(self.path)
+
+    @staticmethod
+    def build(chunks: Iterable[dict], path, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Index ``chunks`` (dicts with a ``sentence_chunk`` key) into directory ``path``.
+
+        Chunks are streamed to disk as they arrive; only the postings are kept
+        in memory. The directory is written under a temporary name and renamed
+        into place, so readers never see a half-written index.
+        """
+        path = Path(path)
+        tmp = temp_dir_for(path)
+
+        try:
+            postings: dict[str, tuple[array, array]] = {}
+            doc_lens = array("I")
+            with DocWriter(tmp) as docs:
+                for chunk in chunks:
+                    doc_id = docs.add(chunk)
+                    counts = Counter(tokenize(chunk["sentence_chunk"]))
+                    doc_lens.append(sum(counts.values()))
+                    for term, tf in counts.items():
+                        entry = postings.get(term)
+                        if entry is None:
+                            entry = postings[term] = (array("I"), array("I"))
+                        entry[0].append(doc_id)
+                        entry[1].append(tf)
+
+            vocab = sorted(postings, key=str.encode)
+            BM25Index._write(tmp, ((term.encode(), *postings[term]) for term in vocab), doc_lens, k1, b)
+            replace_dir(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return BM25Index(path)
+
+    @staticmethod
+    def merge(sources: list[tuple["BM25Index", Iterable[tuple[int, int]]]], path) -> "BM25Index":
+        """Write the given doc id ranges of several indexes into one new index at ``path``.
+
+        Documents are copied as raw lines and postings are merged term by term
+        from the sorted vocabularies, so nothing is re-tokenized and only one
+        term's postings are held in memory. Doc ids are renumbered in source order.
+        """
+        if not sources:
+            raise ValueError("nothing to merge")
+        path = Path(path)
+        tmp = temp_dir_for(path)
+        try:
+            k1, b = sources[0][0].k1, sources[0][0].meta["b"]
+            remaps = []
+            doc_lens = array("I")
+            with DocWriter(tmp) as docs:
+                for index, ranges in sources:
+                    if index.lens is None or (index.k1, index.meta["b"]) != (k1, b):
+                        raise RuntimeError(f"Cannot merge {index.path}: rebuild it with this version")
+                    remap = array("q", [-1]) * len(index)
+                    for start, end in ranges:
+                        for doc_id in range(start, end):
+                            remap[doc_id] = docs.add_raw(index.docs.raw(doc_id))
+                        doc_lens.extend(index.lens[start:end])
+                    remaps.append(remap)
+
+            def vocabulary(n):
+                offsets, terms = sources[n][0].term_offsets, sources[n][0].terms
+                return ((bytes(terms[offsets[i]:offsets[i + 1]]), n, i) for i in range(len(offsets) - 1))
+
+            def merged():
+                for term, group in groupby(heapq.merge(*map(vocabulary, range(len(sources)))), key=itemgetter(0)):
+                    ids, tfs = array("I"), array("I")
+                    for _, n, i in group:
+                        index, remap = sources[n][0], remaps[n]
+                        start, end = index.postings[i], index.postings[i + 1]
+                        for doc_id, tf in zip(index.doc_ids[start:end], index.tfs[start:end]):
+                            new = remap[doc_id]
+                            if new >= 0:
+                                ids.append(new)
+                                tfs.append(tf)
+                    if ids:
+                        yield term, ids, tfs
+
+            BM25Index._write(tmp, merged(), doc_lens, k1, b)
+            replace_dir(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return BM25Index(path)
+
+    @staticmethod
+    def _write(tmp: Path, postings: Iterable[tuple[bytes, array, array]], doc_lens: array, k1: float, b: float) -> None:
+        """Write postings (in vocabulary order), norms and meta next to the docs in ``tmp``."""
+        num_docs = len(doc_lens)
+        avgdl = sum(doc_lens) / num_docs if num_docs else 0.0
+        norms = array("f", (k1 * (1 - b + b * dl / avgdl) if avgdl else k1 for dl in doc_lens))
+
+        term_offsets = array("Q", [0])
+        post_offsets = array("Q", [0])
+        with open(tmp / "terms.bin", "wb") as terms, open(tmp / "docids.bin", "wb") as ids, open(tmp / "tfs.bin", "wb") as tfs:
+            for encoded, term_ids, term_tfs in postings:
+                terms.write(encoded)
+                term_offsets.append(term_offsets[-1] + len(encoded))
+                term_ids.tofile(ids)
+                term_tfs.tofile(tfs)
+                post_offsets.append(post_offsets[-1] + len(term_ids))
+        for name, data in (("terms.idx", term_offsets), ("postings.idx", post_offsets), ("norms.bin", norms),
+                           ("lens.bin", doc_lens)):
+            with open(tmp / name, "wb") as f:
+                data.tofile(f)
+        meta = {"kind": "bm25", "version": FORMAT_VERSION, "byteorder": sys.byteorder, "k1": k1, "b": b,
+                "num_docs": num_docs, "avgdl": avgdl, "num_terms": len(term_offsets) - 1}
+        (tmp / "meta.json").write_text(json.dumps(meta))
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def lookup(self, term: str) -> int:
+        """Vocabulary position of ``term``, or -1."""
+        key = term.encode()
+        offsets, terms = self.term_offsets, self.terms
+        lo, hi = 0, len(offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if terms[offsets[mid]:offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(offsets) - 1 and terms[offsets[lo]:offsets[lo + 1]] == key:
+            return lo
+        return -1
+
+    def df(self, term: str) -> int:
+        i = self.lookup(term)
+        return 0 if i < 0 else self.postings[i + 1] - self.postings[i]
+
+    def document(self, doc_id: int) -> dict:
+        return self.docs[doc_id]
+
+    def normalized(self, avgdl: float):
+        """Per-document norms against another ``avgdl``; the stored ones if ``lens.bin`` is missing."""
+        if self.lens is None:
+            return self.norms
+        k1, b = self.k1, self.meta["b"]
+        return array("f", (k1 * (1 - b + b * dl / avgdl) if avgdl else k1 for dl in self.lens))
+
+    def scores(self, terms: Iterable[str], idf: dict[str, float] | None = None, norms=None) -> dict[int, float]:
+        """Accumulate BM25 scores per doc id. ``idf`` and ``norms`` override the index's own statistics."""
+        scores: dict[int, float] = {}
+        get = scores.get
+        if norms is None:
+            norms = self.norms
+        for term in terms:
+            i = self.lookup(term)
+            if i < 0:
+                continue
+            start, end = self.postings[i], self.postings[i + 1]
+            if idf is not None:
+                weight = idf.get(term, 0.0)
+            else:
+                df = end - start
+                weight = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            weight *= self.k1 + 1
+            for doc_id, tf in zip(self.doc_ids[start:end], self.tfs[start:end]):
+                scores[doc_id] = get(doc_id, 0.0) + weight * tf / (tf + norms[doc_id])
+        return scores
+
+    def search(self, query: str, k: int = 5) -> list[tuple[float, dict]]:
+        """Return the ``k`` best ``(score, chunk)`` pairs for ``query``."""
+        scores = self.scores(set(tokenize(query)))
+        top = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+        return [(score, self.document(doc_id)) for doc_id, score in top]
@@ -0,0 +1,37 @@
+import re
+from typing import Iterable, Iterator
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|(?<=[.!?][\"')\]])\s+")
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in SENTENCE_END.split(text) if s.strip()]
+
+
+def chunk_pages(pages: Iterable[tuple[int, str]], sentences_per_chunk: int = 10, overlap: int = 0,
+                min_tokens: int = 30, source: str | None = None) -> Iterator[dict]:
+    """Group each page's sentences into chunks of ``sentences_per_chunk``.
+
+    Consecutive chunks share ``overlap`` sentences. Chunks of ``min_tokens``
+    or fewer (approximated as 4 characters per token) are dropped.
+    """
+    if sentences_per_chunk < 1 or not 0 <= overlap < sentences_per_chunk:
+        raise ValueError("need sentences_per_chunk >= 1 and 0 <= overlap < sentences_per_chunk")
+    step = sentences_per_chunk - overlap
+    for page_number, text in pages:
+        sentences = split_sentences(text)
+        for start in range(0, len(sentences), step):
+            joined = " ".join(sentences[start:start + sentences_per_chunk]).replace("  ", " ").strip()
+            joined = re.sub(r"\.([A-Z])", r". \1", joined)
+            token_count = len(joined) / 4
+            if token_count > min_tokens:
+                yield {
+                    "source": source,
+                    "page_number": page_number,
+                    "sentence_chunk": joined,
+                    "chunk_char_count": len(joined),
+                    "chunk_word_count": len(joined.split(" ")),
+                    "chunk_token_count": token_count,
+                }
+            if start + sentences_per_chunk >= len(sentences):
+                break
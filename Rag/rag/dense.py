@@ -0,0 +1,220 @@
+import sys
+import json
+import shutil
+import hashlib
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Protocol
+
+import numpy as np
+
+from .bm25 import TOKEN
+from .storage import temp_dir_for, replace_dir, DocWriter, DocReader
+
+FORMAT_VERSION = 1
+
+
+class Embedder(Protocol):
+    name: str
+    dim: int
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Return a ``(len(texts), dim)`` float32 array of L2-normalised rows."""
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder: words and word bigrams hashed into signed buckets.
+
+    Deterministic across runs and machines and needs no model download, so
+    it is the offline default. Bucket assignments are memoised per token.
+    """
+
+    MAX_MEMO = 1 << 20
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        self.buckets: dict[str, tuple[int, float]] = {}
+
+    def bucket(self, token: str) -> tuple[int, float]:
+        hit = self.buckets.get(token)
+        if hit is None:
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            hit = (h % self.dim, 1.0 if h >> 63 else -1.0)
+            if len(self.buckets) < self.MAX_MEMO:
+                self.buckets[token] = hit
+        return hit
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            words = TOKEN.findall(text.lower())
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                col, sign = self.bucket(token)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(cols, dtype=np.int64)
+        out = np.bincount(flat, weights=signs, minlength=len(texts) * self.dim)
+        out = out.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model, e.g. the notebook's ``all-mpnet-base-v2``."""
+
+    def __init__(self, model_name: str = "all-mpnet-base-v2", device: str = "cpu", batch_size: int = 32):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("Install sentence-transformers to use a transformer embedder") from e
+        self.model = SentenceTransformer(model_name_or_path=model_name, device=device)
+        self.batch_size = batch_size
+        self.name = f"st:{model_name}"
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def make_embedder(name: str) -> Embedder:
+    """Recreate an embedder from the ``name`` stored in an index."""
+    if name.startswith("hashing-"):
+        return HashingEmbedder(int(name.removeprefix("hashing-")))
+    if name.startswith("st:"):
+        return SentenceTransformerEmbedder(name.removeprefix("st:"))
+    raise RuntimeError(f"Unknown embedder: {name}")
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """Append-only store of vectors keyed by chunk content hash, one per embedder.
+
+    ``vectors.f32`` holds raw float32 rows and ``keys.bin`` the 16-byte hash of
+    each row. Vectors are appended before their keys, so a key never points
+    past the end of the vector file even after a crash.
+    """
+
+    KEY_SIZE = 16
+
+    def __init__(self, directory, embedder: Embedder):
+        self.embedder = embedder
+        self.directory = Path(directory) / embedder.name.replace("/", "_").replace(":", "_")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keys_path = self.directory / "keys.bin"
+        self.vectors_path = self.directory / "vectors.f32"
+        self.row_bytes = embedder.dim * 4
+        keys = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+        rows = self.vectors_path.stat().st_size // self.row_bytes if self.vectors_path.exists() else 0
+        count = min(len(keys) // self.KEY_SIZE, rows)
+        self.rows = {keys[i * self.KEY_SIZE:(i + 1) * self.KEY_SIZE]: i for i in range(count)}
+        self.count = count
+        self.hits = self.misses = 0
+
+    def vectors(self) -> np.ndarray:
+        if not self.count:
+            return np.empty((0, self.embedder.dim), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.embedder.dim))
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed ``texts``, computing only those whose hash is not cached, in one batch."""
+        keys = [content_hash(text) for text in texts]
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in self.rows and key not in missing:
+                missing[key] = i
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        if missing:
+            fresh = self.embedder.embed([texts[i] for i in missing.values()])
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(self.count * self.row_bytes)
+                f.write(np.ascontiguousarray(fresh, dtype=np.float32).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.truncate(self.count * self.KEY_SIZE)
+                f.write(b"".join(missing))
+            for key in missing:
+                self.rows[key] = self.count
+                self.count += 1
+        return self.vectors()[[self.rows[key] for key in keys]]
+
+
+class DenseIndex:
+    """Chunk embeddings as a float32 matrix in ``vectors.f32``, memory-mapped for search."""
+
+    def __init__(self, path, embedder: Embedder | None = None):
+        self.path = Path(path)
+        try:
+            self.meta = json.loads((self.path / "meta.json").read_text())
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Not a dense index: {self.path}: {e}")
+        if self.meta.get("kind") != "dense" or self.meta.get("version") != FORMAT_VERSION \
+                or self.meta.get("byteorder") != sys.byteorder:
+            raise RuntimeError(f"Incompatible dense index format in {self.path}")
+        self.embedder = embedder or make_embedder(self.meta["embedder"])
+        if self.embedder.name != self.meta["embedder"]:
+            raise RuntimeError(f"Index was built with {self.meta['embedder']}, not {self.embedder.name}")
+        shape = (self.meta["num_docs"], self.meta["dim"])
+        if shape[0]:
+            self.vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r", shape=shape)
+        else:
+            self.vectors = np.empty(shape, dtype=np.float32)
+        self.docs = DocReader(self.path)
+
+    @staticmethod
+    def build(chunks: Iterable[dict], path, embedder: Embedder | None = None, cache_dir=None,
+              batch_size: int = 64) -> "DenseIndex":
+        """Embed ``chunks`` in batches and write the index directory ``path``.
+
+        With ``cache_dir``, vectors are looked up by chunk content hash first,
+        so rebuilding after a small change only embeds the new chunks.
+        """
+        path = Path(path)
+        embedder = embedder or HashingEmbedder()
+        source = EmbeddingCache(cache_dir, embedder) if cache_dir is not None else embedder
+        tmp = temp_dir_for(path)
+        try:
+            chunks = iter(chunks)
+            num_docs = 0
+            with DocWriter(tmp) as docs, open(tmp / "vectors.f32", "wb") as out:
+                while batch := list(islice(chunks, batch_size)):
+                    for chunk in batch:
+                        docs.add(chunk)
+                    vectors = source.embed([chunk["sentence_chunk"] for chunk in batch])
+                    out.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                    num_docs += len(batch)
+            meta = {"kind": "dense", "version": FORMAT_VERSION, "byteorder": sys.byteorder,
+                    "embedder": embedder.name, "dim": embedder.dim, "num_docs": num_docs}
+            (tmp / "meta.json").write_text(json.dumps(meta))
+            replace_dir(tmp, path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return DenseIndex(path, embedder)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def document(self, doc_id: int) -> dict:
+        return self.docs[doc_id]
+
+    def top_k(self, query_vector: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Indices and scores of the ``k`` rows with the largest dot product, best first."""
+        scores = self.vectors @ query_vector
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return top, scores[top]
+
+    def search(self, query: str, k: int = 5) -> list[tuple[float, dict]]:
+        """Return the ``k`` most similar ``(score, chunk)`` pairs for ``query``."""
+        ids, scores = self.top_k(self.embedder.embed([query])[0], k)
+        return [(float(score), self.document(int(i))) for i, score in zip(ids, scores)]
@@ -0,0 +1,55 @@
+from pathlib import Path
+from typing import Iterator
+
+TEXT_SUFFIXES = {".txt", ".md"}
+
+
+def text_formatter(text: str) -> str:
+    """Performs minor formatting on text."""
+    return text.replace("\n", " ").strip()
+
+
+def iter_pages(path) -> Iterator[tuple[int, str]]:
+    """Yield ``(page_number, text)`` for a document, one page at a time.
+
+    PDFs are read through PyMuPDF so only the current page is held in
+    memory. Plain text files are split into pages on form feeds.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".pdf":
+        yield from _iter_pdf_pages(path)
+    elif path.suffix.lower() in TEXT_SUFFIXES:
+        yield from _iter_text_pages(path)
+    else:
+        raise RuntimeError(f"Unsupported document type: {path}")
+
+
+def _iter_pdf_pages(path: Path):
+    try:
+        import fitz
+    except ImportError as e:
+        raise RuntimeError("PDF extraction needs PyMuPDF (pip install PyMuPDF)") from e
+    try:
+        doc = fitz.open(path)
+    except Exception as e:
+        raise RuntimeError(f"Failed to open {path}: {e}")
+    with doc:
+        for page_number, page in enumerate(doc, start=1):
+            yield page_number, text_formatter(page.get_text())
+
+
+def _iter_text_pages(path: Path):
+    page_number, lines = 1, []
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                *done, line = line.split("\f")
+                for part in done:
+                    lines.append(part)
+                    yield page_number, text_formatter("".join(lines))
+                    page_number, lines = page_number + 1, []
+                lines.append(line)
+    except OSError as e:
+        raise RuntimeError(f"Failed to read {path}: {e}")
+    if lines:
+        yield page_number, text_formatter("".join(lines))
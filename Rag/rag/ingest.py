@@ -0,0 +1,411 @@
+import os
+import json
+import math
+import time
+import fcntl
+import heapq
+import shutil
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Iterator
+
+from .extract import iter_pages, TEXT_SUFFIXES
+from .chunk import chunk_pages
+from .bm25 import BM25Index, tokenize
+
+SUFFIXES = TEXT_SUFFIXES | {".pdf"}
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def fingerprint(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def scan(root: Path) -> Iterator[tuple[str, os.stat_result]]:
+    """Yield ``(path relative to root, stat)`` for every supported document under ``root``."""
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUFFIXES:
+                    yield os.path.relpath(entry.path, root), entry.stat()
+
+
+def read_manifest(path: Path) -> dict:
+    try:
+        manifest = json.loads((path / MANIFEST).read_text())
+    except FileNotFoundError:
+        return {"kind": "segments", "version": FORMAT_VERSION, "generation": 0, "next_segment": 0,
+                "options": None, "segments": {}, "files": {}}
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Unreadable manifest in {path}: {e}")
+    if manifest.get("kind") != "segments" or manifest.get("version") != FORMAT_VERSION:
+        raise RuntimeError(f"Incompatible segmented index format in {path}")
+    return manifest
+
+
+def write_manifest(path: Path, manifest: dict, bump: bool = True) -> None:
+    """Publish ``manifest`` atomically; this is the commit point of an ingestion.
+
+    ``bump`` advances the generation, which tells readers to reopen segments.
+    """
+    if bump:
+        manifest["generation"] += 1
+    tmp = path / f".{MANIFEST}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path / MANIFEST)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def index_batch(files: list[tuple[str, int, int, str | None]], segment: str, options: dict) -> tuple[dict, int]:
+    """Fingerprint, extract, chunk and index one batch of files into a new segment.
+
+    Runs in a worker process. ``files`` holds ``(path, size, mtime_ns, known_hash)``
+    with paths relative to the documents directory; files whose content hash
+    matches ``known_hash`` are not re-indexed and get no ``docs`` range.
+    Returns the manifest entries for the batch and the segment's chunk count.
+    """
+    entries = {}
+    docs_dir = Path(options["docs"])
+
+    def chunks():
+        doc_id = 0
+        for path, size, mtime_ns, known in files:
+            try:
+                digest = fingerprint(docs_dir / path)
+            except OSError:
+                continue  # removed since the scan; the next scan drops it
+            entry = entries[path] = {"size": size, "mtime_ns": mtime_ns, "sha256": digest}
+            if digest == known:
+                continue
+            start = doc_id
+            try:
+                for chunk in chunk_pages(iter_pages(docs_dir / path), options["sentences"], options["overlap"],
+                                         options["min_tokens"], source=path):
+                    yield chunk
+                    doc_id += 1
+            except (RuntimeError, OSError, ValueError) as e:
+                # No hash, so the next scan retries it (e.g. once PyMuPDF is installed).
+                entry["error"] = str(e)
+                entry["sha256"] = None
+            entry.update(segment=segment, docs=[start, doc_id])
+
+    directory = Path(options["root"]) / "segments" / segment
+    index = BM25Index.build(chunks(), directory)
+    if not len(index):
+        shutil.rmtree(directory, ignore_errors=True)
+    return entries, len(index)
+
+
+def merge_segments(root: str, sources: list[tuple[str, list[tuple[str, int, int]]]], segment: str) -> tuple[dict, int]:
+    """Merge the live chunks of several segments into a new one. Runs in a worker process.
+
+    ``sources`` lists each segment with the ``(path, start, end)`` chunk ranges
+    still live in it. Returns each file's ``(old segment, new range)`` and the
+    merged segment's chunk count.
+    """
+    segments = Path(root) / "segments"
+    moved, doc_id = {}, 0
+    for name, ranges in sources:
+        for path, start, end in ranges:
+            moved[path] = (name, [doc_id, doc_id + end - start])
+            doc_id += end - start
+    index = BM25Index.merge(
+        [(BM25Index(segments / name), [(start, end) for _, start, end in ranges]) for name, ranges in sources],
+        segments / segment,
+    )
+    return moved, len(index)
+
+
+def batches(pending: list, max_files: int, max_bytes: int) -> Iterator[list]:
+    batch, size = [], 0
+    for item in pending:
+        if batch and (len(batch) >= max_files or size + item[1] > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(item)
+        size += item[1]
+    if batch:
+        yield batch
+
+
+class Ingester:
+    """Keeps a segmented BM25 index in ``index_dir`` in sync with the documents under ``docs_dir``.
+
+    Each run indexes only new or changed files, a batch per worker process,
+    and every batch becomes its own segment. Segments of similar size are
+    then merged ``merge_factor`` at a time, also in the pool. The manifest lists the live
+    segments and which chunk range of which segment holds each file; it is
+    replaced atomically, so readers see either the old or the new index.
+    Segments dropped by a run are deleted at the start of the next one.
+    """
+
+    def __init__(self, docs_dir, index_dir, workers: int | None = None, sentences: int = 10, overlap: int = 0,
+                 min_tokens: int = 30, batch_files: int = 64, batch_bytes: int = 32 << 20,
+                 merge_factor: int = 10, max_merge_docs: int = 500_000, commit_interval: float = 5.0):
+        if merge_factor < 2:
+            raise ValueError("need merge_factor >= 2")
+        self.docs_dir = Path(docs_dir).resolve()
+        self.root = Path(index_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.options = {"sentences": sentences, "overlap": overlap, "min_tokens": min_tokens}
+        self.batch_files = batch_files
+        self.batch_bytes = batch_bytes
+        self.merge_factor = merge_factor
+        self.max_merge_docs = max_merge_docs
+        self.commit_interval = commit_interval
+        # The manifest as last written and what searches saw of it; reloaded from disk by each run.
+        self.committed: str | None = None
+        self.visible: tuple[dict, dict] | None = None
+
+    def run(self) -> dict:
+        """Ingest once and return counts of what changed."""
+        if not self.docs_dir.is_dir():
+            raise RuntimeError(f"Not a directory: {self.docs_dir}")
+        (self.root / "segments").mkdir(parents=True, exist_ok=True)
+        with open(self.root / "LOCK", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError(f"Another ingestion is running on {self.root}")
+            return self._run()
+
+    def _run(self) -> dict:
+        start = time.perf_counter()
+        manifest = read_manifest(self.root)
+        self.committed = json.dumps(manifest, sort_keys=True) if (self.root / MANIFEST).exists() else None
+        self.visible = self.view(manifest)
+        self.collect_garbage(manifest)
+        if manifest["options"] != self.options:
+            # Different chunking: every file must be re-indexed.
+            for entry in manifest["files"].values():
+                entry["sha256"] = None
+            manifest["options"] = self.options
+
+        seen, pending = set(), []
+        for path, st in scan(self.docs_dir):
+            seen.add(path)
+            entry = manifest["files"].get(path)
+            if entry and entry["sha256"] and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                continue
+            pending.append((path, st.st_size, st.st_mtime_ns, entry["sha256"] if entry else None))
+        removed = [path for path in manifest["files"] if path not in seen]
+        for path in removed:
+            del manifest["files"][path]
+        stats = {"scanned": len(seen), "changed": 0, "unchanged": len(seen) - len(pending),
+                 "removed": len(removed), "chunks": 0, "errors": 0, "merged": 0}
+
+        options = dict(self.options, root=str(self.root), docs=str(self.docs_dir))
+        # Small runs are split evenly so that every worker gets a batch.
+        todo = batches(pending, max(1, min(self.batch_files, -(-len(pending) // self.workers))), self.batch_bytes)
+        last_commit = time.monotonic()
+        with ProcessPoolExecutor(self.workers) as pool:
+            running = {}
+            # At most two batches per worker are in flight, so memory does not grow with the corpus.
+            while True:
+                for batch in islice(todo, 2 * self.workers - len(running)):
+                    segment = f"seg-{manifest['next_segment']:06d}"
+                    manifest["next_segment"] += 1
+                    running[pool.submit(index_batch, batch, segment, options)] = segment
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.apply(manifest, running.pop(future), *future.result(), stats)
+                if time.monotonic() - last_commit >= self.commit_interval:
+                    self.commit(manifest)
+                    last_commit = time.monotonic()
+            self.compact(manifest, pool, stats)
+        self.commit(manifest)
+        stats["segments"] = len(manifest["segments"])
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    def apply(self, manifest: dict, segment: str, entries: dict, num_docs: int, stats: dict) -> None:
+        """Record a finished batch; replaced files now point at the new segment."""
+        files = manifest["files"]
+        for path, entry in entries.items():
+            if "docs" not in entry:  # content unchanged, only the mtime moved
+                files[path].update(entry)
+                stats["unchanged"] += 1
+                continue
+            start, end = entry["docs"]
+            if start == end:
+                del entry["segment"], entry["docs"]
+            stats["changed"] += 1
+            stats["errors"] += "error" in entry
+            files[path] = entry
+        if num_docs:
+            manifest["segments"][segment] = {"num_docs": num_docs}
+            stats["chunks"] += num_docs
+
+    def live_docs(self, manifest: dict) -> dict[str, int]:
+        live = dict.fromkeys(manifest["segments"], 0)
+        for entry in manifest["files"].values():
+            if "segment" in entry:
+                start, end = entry["docs"]
+                live[entry["segment"]] += end - start
+        return live
+
+    def merge_plans(self, manifest: dict) -> list[list[str]]:
+        """Drop empty segments and pick groups of segments to merge.
+
+        Segments are tiered by live chunk count on a log scale of ``merge_factor``;
+        a tier holding ``merge_factor`` segments is merged into one, unless that
+        would exceed ``max_merge_docs``. A segment whose chunks are mostly
+        superseded is rewritten on its own to drop them.
+        """
+        live = self.live_docs(manifest)
+        for name, count in live.items():
+            if not count:
+                del manifest["segments"][name]
+        plans, tiers = [], {}
+        for name in sorted(manifest["segments"], key=live.get):
+            if 2 * live[name] < manifest["segments"][name]["num_docs"]:
+                plans.append([name])
+            else:
+                tiers.setdefault(int(math.log(live[name], self.merge_factor)), []).append(name)
+        for names in tiers.values():
+            for i in range(0, len(names) - self.merge_factor + 1, self.merge_factor):
+                group = names[i:i + self.merge_factor]
+                while len(group) > 1 and sum(map(live.get, group)) > self.max_merge_docs:
+                    group.pop()
+                if len(group) > 1:
+                    plans.append(group)
+        return plans
+
+    def compact(self, manifest: dict, pool: ProcessPoolExecutor, stats: dict) -> None:
+        """Run merge plans in the pool until none are left; a merge can fill the next tier."""
+        files = manifest["files"]
+        while plans := self.merge_plans(manifest):
+            ranges = {}
+            for path, entry in files.items():
+                if "segment" in entry:
+                    ranges.setdefault(entry["segment"], []).append((path, *entry["docs"]))
+            running = {}
+            for names in plans:
+                segment = f"seg-{manifest['next_segment']:06d}"
+                manifest["next_segment"] += 1
+                sources = [(name, sorted(ranges[name], key=itemgetter(1))) for name in names]
+                running[pool.submit(merge_segments, str(self.root), sources, segment)] = (segment, names)
+            for future, (segment, names) in running.items():
+                moved, num_docs = future.result()
+                for path, (name, docs) in moved.items():
+                    entry = files[path]
+                    if entry.get("segment") == name:
+                        entry.update(segment=segment, docs=docs)
+                for name in names:
+                    del manifest["segments"][name]
+                manifest["segments"][segment] = {"num_docs": num_docs}
+                stats["merged"] += len(names)
+
+    @staticmethod
+    def view(manifest: dict) -> tuple[dict, dict]:
+        """What searches see: the live segments and where each file's chunks are."""
+        files = {path: (entry.get("segment"), entry.get("docs")) for path, entry in manifest["files"].items()}
+        return dict(manifest["segments"]), files
+
+    def commit(self, manifest: dict) -> None:
+        """Write the manifest if it changed; readers only reopen if the searchable view changed."""
+        if json.dumps(manifest, sort_keys=True) == self.committed:
+            return
+        view = self.view(manifest)
+        write_manifest(self.root, manifest, bump=view != self.visible)
+        self.committed = json.dumps(manifest, sort_keys=True)
+        self.visible = view
+
+    def collect_garbage(self, manifest: dict) -> None:
+        """Remove segment directories the current manifest no longer references."""
+        for entry in os.scandir(self.root / "segments"):
+            if entry.name not in manifest["segments"]:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def watch(self, interval: float = 2.0, callback=None) -> None:
+        """Re-run every ``interval`` seconds until interrupted."""
+        while True:
+            stats = self.run()
+            if callback:
+                callback(stats)
+            time.sleep(interval)
+
+
+class SegmentedIndex:
+    """Searches all live segments of an ingested index as one BM25 index.
+
+    IDF uses document frequencies summed over segments and length norms use
+    the average document length over all of them, so scores do not depend on
+    how files were batched into segments. Chunks of replaced files still count
+    towards those statistics until their segment is merged away, as in Lucene.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if not (self.path / MANIFEST).exists():
+            raise RuntimeError(f"Not a segmented index: {self.path}")
+        self.generation = None
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Reopen if an ingestion has committed since; returns whether anything changed."""
+        for attempt in range(3):
+            manifest = read_manifest(self.path)
+            if manifest["generation"] == self.generation:
+                return False
+            try:
+                segments = {name: BM25Index(self.path / "segments" / name) for name in manifest["segments"]}
+                break
+            except RuntimeError:
+                # A segment was garbage-collected between reading the manifest and opening it.
+                if attempt == 2:
+                    raise
+        self.segments = []
+        for name, index in segments.items():
+            live = bytearray(len(index))
+            for entry in manifest["files"].values():
+                if entry.get("segment") == name:
+                    start, end = entry["docs"]
+                    live[start:end] = b"\x01" * (end - start)
+            self.segments.append((index, live))
+        self.num_docs = sum(len(index) for index, _ in self.segments)
+        total = sum(index.meta["avgdl"] * len(index) for index, _ in self.segments)
+        avgdl = total / self.num_docs if self.num_docs else 0.0
+        self.norms = [index.normalized(avgdl) for index, _ in self.segments]
+        self.generation = manifest["generation"]
+        return True
+
+    def __len__(self) -> int:
+        return sum(sum(live) for _, live in self.segments)
+
+    def idf(self, terms) -> dict[str, float]:
+        idf = {}
+        for term in terms:
+            df = sum(index.df(term) for index, _ in self.segments)
+            if df:
+                idf[term] = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+        return idf
+
+    def search(self, query: str, k: int = 5) -> list[tuple[float, dict]]:
+        terms = set(tokenize(query))
+        idf = self.idf(terms)
+        hits = []
+        for (index, live), norms in zip(self.segments, self.norms):
+            scores = index.scores(terms, idf, norms)
+            top = heapq.nlargest(k, ((s, d) for d, s in scores.items() if live[d]))
+            hits.extend((score, doc_id, index) for score, doc_id in top)
+        return [(score, index.document(doc_id)) for score, doc_id, index in heapq.nlargest(k, hits, key=itemgetter(0))]
@@ -0,0 +1,78 @@
+import os
+import json
+import mmap
+import shutil
+from array import array
+from pathlib import Path
+
+
+def map_file(path: Path, typecode: str | None = None):
+    """Memory-map a file read-only, as bytes or as a typed memoryview."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            data = b""
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(data).cast(typecode) if typecode else data
+
+
+def temp_dir_for(path: Path) -> Path:
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    return tmp
+
+
+def replace_dir(tmp: Path, path: Path) -> None:
+    """Move a finished index directory into place; open readers keep their mappings."""
+    if path.exists():
+        old = path.with_name(f".{path.name}.old{os.getpid()}")
+        os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(tmp, path)
+
+
+class DocWriter:
+    """Appends chunks to ``docs.jsonl`` and records their offsets in ``docs.idx``."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.file = open(directory / "docs.jsonl", "wb")
+        self.offsets = array("Q", [0])
+
+    def add(self, chunk: dict) -> int:
+        return self.add_raw(json.dumps(chunk).encode() + b"\n")
+
+    def add_raw(self, line: bytes) -> int:
+        """Append an already encoded line, e.g. one copied from a ``DocReader``."""
+        self.file.write(line)
+        self.offsets.append(self.offsets[-1] + len(line))
+        return len(self.offsets) - 2
+
+    def close(self) -> None:
+        self.file.close()
+        with open(self.directory / "docs.idx", "wb") as f:
+            self.offsets.tofile(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DocReader:
+    def __init__(self, directory: Path):
+        self.docs = map_file(directory / "docs.jsonl")
+        self.offsets = map_file(directory / "docs.idx", "Q")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> dict:
+        return json.loads(self.raw(i))
+
+    def raw(self, i: int) -> bytes:
+        return self.docs[self.offsets[i]:self.offsets[i + 1]]
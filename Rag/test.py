@@ -0,0 +1,324 @@
+import os
+import json
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import numpy as np
+from rag import iter_pages, chunk_pages, split_sentences, BM25Index, tokenize
+from rag import DenseIndex, EmbeddingCache, HashingEmbedder, Ingester, SegmentedIndex
+
+
+def make_chunk(text, page_number=1):
+    return {"source": "test", "page_number": page_number, "sentence_chunk": text}
+
+
+class TestExtract(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_text_pages_split_on_form_feed(self):
+        doc = self.temp_dir / "doc.txt"
+        doc.write_text("first\npage\fsecond page\f\fthird")
+        self.assertEqual(list(iter_pages(doc)), [(1, "first page"), (2, "second page"), (3, ""), (4, "third")])
+
+    def test_unsupported_type(self):
+        with self.assertRaises(RuntimeError):
+            list(iter_pages(self.temp_dir / "doc.docx"))
+
+
+class TestChunk(unittest.TestCase):
+    def test_split_sentences(self):
+        self.assertEqual(split_sentences("One. Two! \"Three?\" Four"), ["One.", "Two!", "\"Three?\"", "Four"])
+
+    def test_chunks_group_sentences_per_page(self):
+        text = " ".join(f"Sentence number {i} is here." for i in range(7))
+        chunks = list(chunk_pages([(3, text)], sentences_per_chunk=3, min_tokens=0))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0]["page_number"], 3)
+        self.assertTrue(chunks[2]["sentence_chunk"].startswith("Sentence number 6"))
+
+    def test_overlap_and_min_tokens(self):
+        text = " ".join(f"Sentence number {i} is here." for i in range(4))
+        chunks = list(chunk_pages([(1, text)], sentences_per_chunk=2, overlap=1, min_tokens=0))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(list(chunk_pages([(1, "Too short.")], min_tokens=30)), [])
+        with self.assertRaises(ValueError):
+            list(chunk_pages([], sentences_per_chunk=2, overlap=2))
+
+
+class TestBM25Index(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.chunks = [
+            make_chunk("Alice fell down the rabbit hole."),
+            make_chunk("The White Rabbit, a rabbit in a hurry, was late."),
+            make_chunk("The Queen of Hearts shouted off with her head."),
+            make_chunk("Alice met the Cheshire Cat in the woods."),
+        ]
+        self.index = BM25Index.build(self.chunks, self.temp_dir / "index")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_tokenize_drops_stopwords(self):
+        self.assertEqual(tokenize("The Rabbit-hole, and Alice!"), ["rabbit", "hole", "alice"])
+
+    def test_search_ranks_matching_chunks(self):
+        results = self.index.search("rabbit", k=5)
+        self.assertEqual([chunk["sentence_chunk"] for _, chunk in results],
+                         [self.chunks[1]["sentence_chunk"], self.chunks[0]["sentence_chunk"]])
+        self.assertGreater(results[0][0], results[1][0])
+
+    def test_top_k_and_unknown_terms(self):
+        self.assertEqual(len(self.index.search("alice rabbit queen cat", k=2)), 2)
+        self.assertEqual(self.index.search("jabberwocky"), [])
+
+    def test_reopen_from_disk(self):
+        reopened = BM25Index(self.temp_dir / "index")
+        self.assertEqual(len(reopened), 4)
+        self.assertEqual(reopened.df("alice"), 2)
+        self.assertEqual(reopened.document(2), self.chunks[2])
+
+    def test_rebuild_replaces_index(self):
+        BM25Index.build([make_chunk("Only the Mock Turtle now.")], self.temp_dir / "index")
+        self.assertEqual(len(BM25Index(self.temp_dir / "index")), 1)
+
+    def test_merge_matches_a_fresh_build(self):
+        first = BM25Index.build(self.chunks[:2], self.temp_dir / "first")
+        second = BM25Index.build(self.chunks[2:], self.temp_dir / "second")
+        merged = BM25Index.merge([(first, [(0, 2)]), (second, [(1, 2)])], self.temp_dir / "merged")
+        fresh = BM25Index.build(self.chunks[:2] + self.chunks[3:], self.temp_dir / "fresh")
+        self.assertEqual(len(merged), 3)
+        self.assertEqual([merged.document(i) for i in range(3)], [fresh.document(i) for i in range(3)])
+        for query in ("alice rabbit", "queen cat", "rabbit"):
+            self.assertEqual(merged.search(query), fresh.search(query))
+        self.assertEqual(merged.meta, fresh.meta)
+
+    def test_failed_build_leaves_nothing_behind(self):
+        with self.assertRaises(KeyError):
+            BM25Index.build(self.chunks + [{"source": "test"}], self.temp_dir / "broken")
+        other = BM25Index.build(self.chunks, self.temp_dir / "other", k1=1.2)
+        with self.assertRaises(RuntimeError):
+            BM25Index.merge([(self.index, [(0, 4)]), (other, [(0, 4)])], self.temp_dir / "broken")
+        self.assertEqual(sorted(p.name for p in self.temp_dir.iterdir()), ["index", "other"])
+
+    def test_empty_index(self):
+        empty = BM25Index.build([], self.temp_dir / "empty")
+        self.assertEqual(empty.search("alice"), [])
+
+    def test_missing_index(self):
+        with self.assertRaises(RuntimeError):
+            BM25Index(self.temp_dir / "missing")
+
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self, dim=64):
+        super().__init__(dim)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+class TestDenseIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.chunks = [
+            make_chunk("Alice was beginning to get very tired of sitting by her sister on the bank."),
+            make_chunk("The White Rabbit took a watch out of its waistcoat pocket and hurried on."),
+            make_chunk("The Queen of Hearts shouted off with her head at the croquet ground."),
+            make_chunk("The Cheshire Cat grinned from ear to ear on the branch of a tree."),
+        ]
+        self.embedder = CountingEmbedder()
+        self.index = DenseIndex.build(self.chunks, self.temp_dir / "index", self.embedder,
+                                      cache_dir=self.temp_dir / "cache", batch_size=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_embedder_is_deterministic_and_normalised(self):
+        vectors = self.embedder.embed(["white rabbit", "white rabbit", ""])
+        self.assertEqual(vectors.shape, (3, 64))
+        self.assertEqual(vectors.dtype, np.float32)
+        np.testing.assert_array_equal(vectors[0], HashingEmbedder(64).embed(["white rabbit"])[0])
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        self.assertFalse(vectors[2].any())
+
+    def test_search_ranks_matching_chunk_first(self):
+        results = self.index.search("the white rabbit and its watch", k=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][1], self.chunks[1])
+        self.assertGreater(results[0][0], results[1][0])
+
+    def test_cache_skips_unchanged_chunks(self):
+        self.embedder.embedded = 0
+        chunks = self.chunks + [make_chunk("The Mock Turtle sighed deeply and began to sing.")]
+        DenseIndex.build(chunks, self.temp_dir / "index", self.embedder, cache_dir=self.temp_dir / "cache")
+        self.assertEqual(self.embedder.embedded, 1)
+        cache = EmbeddingCache(self.temp_dir / "cache", self.embedder)
+        self.assertEqual(cache.count, 5)
+        np.testing.assert_array_equal(cache.embed([self.chunks[0]["sentence_chunk"]])[0], self.index.vectors[0])
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_reopen_from_disk(self):
+        reopened = DenseIndex(self.temp_dir / "index")
+        self.assertEqual(len(reopened), 4)
+        self.assertEqual(reopened.embedder.name, "hashing-64")
+        self.assertEqual(reopened.document(3), self.chunks[3])
+        np.testing.assert_array_equal(reopened.vectors, self.index.vectors)
+
+    def test_failed_build_leaves_nothing_behind(self):
+        with self.assertRaises(KeyError):
+            DenseIndex.build(self.chunks + [{"source": "test"}], self.temp_dir / "broken", self.embedder)
+        self.assertEqual(sorted(p.name for p in self.temp_dir.iterdir()), ["cache", "index"])
+
+    def test_empty_index(self):
+        empty = DenseIndex.build([], self.temp_dir / "empty", self.embedder)
+        self.assertEqual(empty.search("alice"), [])
+
+    def test_wrong_kind(self):
+        with self.assertRaises(RuntimeError):
+            DenseIndex(BM25Index.build(self.chunks, self.temp_dir / "bm25").path)
+
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.docs = self.temp_dir / "docs"
+        (self.docs / "sub").mkdir(parents=True)
+        self.write("alice.txt", "Alice was beginning to get very tired of sitting by her sister.")
+        self.write("rabbit.md", "The White Rabbit took a watch out of its waistcoat pocket.")
+        self.write("sub/queen.txt", "The Queen of Hearts shouted off with her head.")
+        (self.docs / "notes.docx").write_text("not a supported document")
+        self.index_dir = self.temp_dir / "index"
+        self.ingester = Ingester(self.docs, self.index_dir, workers=2, min_tokens=0, batch_files=1, merge_factor=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, name, text):
+        (self.docs / name).write_text(text)
+
+    def sources(self, query, index=None):
+        index = index or SegmentedIndex(self.index_dir)
+        return [chunk["source"] for _, chunk in index.search(query, k=5)]
+
+    def test_unchanged_files_are_skipped(self):
+        stats = self.ingester.run()
+        self.assertEqual((stats["scanned"], stats["changed"], stats["chunks"]), (3, 3, 3))
+        self.assertEqual(self.sources("queen hearts"), [str(Path("sub/queen.txt"))])
+        stats = self.ingester.run()
+        self.assertEqual((stats["changed"], stats["unchanged"]), (0, 3))
+        # A new mtime alone is only re-hashed, not re-indexed.
+        os.utime(self.docs / "alice.txt", ns=(0, 0))
+        stats = self.ingester.run()
+        self.assertEqual((stats["changed"], stats["unchanged"]), (0, 3))
+
+    def test_changed_and_removed_files_replace_old_chunks(self):
+        self.ingester.run()
+        self.write("alice.txt", "Alice followed the rabbit down a very deep rabbit hole.")
+        (self.docs / "sub" / "queen.txt").unlink()
+        stats = self.ingester.run()
+        self.assertEqual((stats["changed"], stats["removed"]), (1, 1))
+        self.assertEqual(self.sources("rabbit"), ["alice.txt", "rabbit.md"])
+        self.assertEqual(self.sources("sister"), [])
+        self.assertEqual(self.sources("queen"), [])
+        self.assertEqual(len(SegmentedIndex(self.index_dir)), 2)
+
+    def test_segments_are_merged(self):
+        self.ingester.run()
+        for i in range(4):
+            self.write(f"extra{i}.txt", f"Extra page number {i} about the Mock Turtle.")
+            self.ingester.run()
+        index = SegmentedIndex(self.index_dir)
+        self.assertLessEqual(len(index.segments), 4)
+        self.assertEqual(len(index), 7)
+        self.assertEqual(len(self.sources("mock turtle")), 4)
+        self.assertEqual(self.sources("watch"), ["rabbit.md"])
+
+    def test_open_reader_keeps_its_snapshot(self):
+        self.ingester.run()
+        reader = SegmentedIndex(self.index_dir)
+        self.assertFalse(reader.refresh())
+        self.write("rabbit.md", "The Dormouse fell asleep at the tea party.")
+        self.ingester.run()
+        self.assertEqual(self.sources("watch", reader), ["rabbit.md"])
+        self.assertTrue(reader.refresh())
+        self.assertEqual(self.sources("watch", reader), [])
+        self.assertEqual(self.sources("dormouse", reader), ["rabbit.md"])
+
+    def test_unchanged_run_does_not_commit(self):
+        self.ingester.run()
+        manifest = self.index_dir / "manifest.json"
+        reader = SegmentedIndex(self.index_dir)
+        before = os.stat(manifest)
+        self.ingester.run()
+        self.assertEqual(os.stat(manifest).st_ino, before.st_ino)
+        os.utime(self.docs / "alice.txt", ns=(0, 0))
+        self.ingester.run()
+        self.assertNotEqual(os.stat(manifest).st_ino, before.st_ino)
+        self.assertFalse(reader.refresh())
+        self.write("alice.txt", "Alice grew very tall after the cake.")
+        self.ingester.run()
+        self.assertTrue(reader.refresh())
+
+    def test_scores_match_a_single_index(self):
+        docs = self.temp_dir / "lengths"
+        docs.mkdir()
+        (docs / "short.txt").write_text("The rabbit ran.")
+        (docs / "long.txt").write_text("The rabbit sat under a tree in the garden near a pond full of "
+                                       "lilies and frogs, watching clouds drift slowly over the hills.")
+        Ingester(docs, self.index_dir, workers=1, min_tokens=0, batch_files=1).run()
+        segmented = SegmentedIndex(self.index_dir)
+        self.assertEqual(len(segmented.segments), 2)
+        chunks = [index.document(d) for index, _ in segmented.segments for d in range(len(index))]
+        single = BM25Index.build(chunks, self.temp_dir / "single")
+        expected = [(chunk["source"], score) for score, chunk in single.search("rabbit")]
+        actual = [(chunk["source"], score) for score, chunk in segmented.search("rabbit")]
+        self.assertEqual([source for source, _ in actual], [source for source, _ in expected])
+        for (_, a), (_, e) in zip(actual, expected):
+            self.assertAlmostEqual(a, e, places=5)
+
+    def test_segment_changes_bump_the_generation(self):
+        self.ingester.run()
+        manifest = json.loads((self.index_dir / "manifest.json").read_text())
+        generation = manifest["generation"]
+        manifest["files"]["extra.txt"] = {"segment": None, "docs": None}
+        self.ingester.commit(manifest)
+        # The same manifest object again, with only a segment swapped in place (as a merge does).
+        manifest["segments"]["merged"] = manifest["segments"].pop(next(iter(manifest["segments"])))
+        self.ingester.commit(manifest)
+        self.assertEqual(json.loads((self.index_dir / "manifest.json").read_text())["generation"], generation + 2)
+
+    def test_failed_files_are_retried(self):
+        (self.docs / "broken.pdf").write_bytes(b"not a pdf")
+        stats = self.ingester.run()
+        self.assertEqual((stats["changed"], stats["errors"]), (4, 1))
+        stats = self.ingester.run()
+        self.assertEqual((stats["changed"], stats["unchanged"], stats["errors"]), (1, 3, 1))
+        self.assertEqual(len(SegmentedIndex(self.index_dir)), 3)
+
+    def test_missing_docs_directory(self):
+        with self.assertRaises(RuntimeError):
+            Ingester(self.temp_dir / "missing", self.index_dir).run()
+        self.assertFalse(self.index_dir.exists())
+
+    def test_merge_factor_must_merge(self):
+        for merge_factor in (0, 1):
+            with self.assertRaises(ValueError):
+                Ingester(self.docs, self.index_dir, merge_factor=merge_factor)
+
+    def test_missing_index(self):
+        with self.assertRaises(RuntimeError):
+            SegmentedIndex(self.temp_dir / "missing")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,24 +3,38 @@ import shlex
 import readline
 import subprocess
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from completion import DirectoryListings, prefix_range
+from jobcontrol import JobTable
+from timing import TimingTrace
+
+
 class MiniShell:
-    def __init__(self):
-        self.builtins = {"type", "echo", "exit", "pwd", "cd"}
+    def __init__(self, interactive=True):
+        self.builtins = {"type", "echo", "exit", "pwd", "cd", "jobs", "fg", "bg", "wait", "set"}
         self.redirects = {">", ">>", "1>", "1>>", "2>", "2>>"}
         self.paths = os.getenv("PATH", "").split(":")
         self.tab_state = {"count": 0, "last_text": ""}  
-        self.commands = self.get_all_commands()
-        self.setup_readline()       
+        self.matches = []
+        self.listings = DirectoryListings()
+        self.jobs = JobTable()
+        self.status = 0
+        self.errexit = False
+        self.trace = None
+        self.commands = []
+        if interactive:
+            self.commands = self.get_all_commands()
+            self.setup_readline()       
 
     def get_all_commands(self):
         cmds = set(self.builtins)
         for path in self.paths:
             try:
-                for file in os.listdir(path):
-                    full = os.path.join(path, file)
-                    if os.path.isfile(full) and os.access(full, os.X_OK):
-                        cmds.add(file)
-            except (FileNotFoundError, PermissionError):
+                with os.scandir(path or ".") as entries:
+                    for entry in entries:
+                        if entry.is_file() and os.access(entry.path, os.X_OK):
+                            cmds.add(entry.name)
+            except OSError:
                 continue
         return sorted(cmds)
 
@@ -39,8 +53,17 @@ class MiniShell:
         readline.parse_and_bind("tab: complete")
         readline.set_completer_delims(" \t\n")
         
+    def find_matches(self, text, first_word):
+        if first_word and "/" not in text:
+            lo, hi = prefix_range(self.commands, text)
+            return self.commands[lo:hi]
+        return self.listings.complete(text, file_suffix="")
+
     def completer(self,text, state):
-        matches = [cmd for cmd in self.commands if cmd.startswith(text)]
+        if state == 0:
+            first_word = not readline.get_line_buffer()[:readline.get_begidx()].strip()
+            self.matches = self.find_matches(text, first_word)
+        matches = self.matches
         if self.tab_state["last_text"] != text:
             self.tab_state["count"] = 0
             self.tab_state["last_text"] = text
@@ -57,11 +80,17 @@ class MiniShell:
                 sys.stdout.flush()
                 return text
         if state < len(matches):
-            return matches[state] + " "
+            return matches[state] if matches[state].endswith("/") else matches[state] + " "
         return None
 
 
     def cmd_exit(self, args,out=sys.stdout):
+        if args:
+            try:
+                self.status = int(args[0]) & 0xFF
+            except ValueError:
+                print(f"exit: {args[0]}: numeric argument required",file=out)
+                self.status = 2
         raise SystemExit
 
     def cmd_echo(self, args,out=sys.stdout):
@@ -78,10 +107,61 @@ class MiniShell:
             os.chdir(target)
         except FileNotFoundError:
             print(f"cd: {target}: No such file or directory",file=out)
+            self.status = 1
         except NotADirectoryError:
             print(f"cd: {target}: Not a directory",file=out)
+            self.status = 1
         except PermissionError:
             print(f"cd: {target}: Permission denied",file=out)
+            self.status = 1
+
+    def cmd_set(self, args,out=sys.stdout):
+        for option in args:
+            if option in ("-e", "+e"):
+                self.errexit = option == "-e"
+            else:
+                print(f"set: {option}: invalid option",file=out)
+                self.status = 2
+
+    def cmd_jobs(self, args,out=sys.stdout):
+        for job in list(self.jobs.jobs.values()):
+            print(self.jobs.format(job),file=out)
+            if job.done:
+                del self.jobs.jobs[job.job_id]
+
+    def cmd_fg(self, args,out=sys.stdout):
+        job = self.jobs.find(args[0] if args else None)
+        if job is None:
+            print(f"fg: {args[0] if args else 'current'}: no such job",file=out)
+            self.status = 1
+            return
+        print(job.command,file=out)
+        self.status = self.jobs.resume(job, foreground=True)
+
+    def cmd_bg(self, args,out=sys.stdout):
+        job = self.jobs.find(args[0] if args else None)
+        if job is None:
+            print(f"bg: {args[0] if args else 'current'}: no such job",file=out)
+            self.status = 1
+            return
+        self.jobs.resume(job)
+        print(f"[{job.job_id}]+ {job.command} &",file=out)
+
+    def cmd_wait(self, args,out=sys.stdout):
+        if not args:
+            for job in list(self.jobs.jobs.values()):
+                if not job.stopped:
+                    self.jobs.wait(job)
+            return
+        for spec in args:
+            job = self.jobs.find(spec)
+            if job is None and spec.isdigit():
+                job = next((j for j in self.jobs.jobs.values() if int(spec) in (p.pid for p in j.processes)), None)
+            if job is None:
+                print(f"wait: {spec}: no such job",file=out)
+                self.status = 127
+                continue
+            self.status = self.jobs.wait(job)
 
     def cmd_type(self, args,out=sys.stdout):
         try:
@@ -94,15 +174,19 @@ class MiniShell:
                     print(f"{name} is {path}",file=out)
                 else:
                     print(f"{name}: not found",file=out)
+                    self.status = 1
         except IndexError:
             print("type: missing operand",file=out)
+            self.status = 2
                       
-    def exe_pipeline(self,commands):
+    def exe_pipeline(self,commands,background=False):
         if not commands:
             return
         processes = []
         prev_stdout = None
         prev_stdin=None
+        pgid = 0
+        final = None
         for i, cmd_tokens in enumerate(commands):
             exe = cmd_tokens[0]
             args = cmd_tokens[1:]
@@ -115,46 +199,67 @@ class MiniShell:
                     prev_stdin = output_str.encode() if output_str else None
                 else:
                     print(output_str, end="")
+                    final = self.status
             else:
                 path = self.find_exe(exe)
                 if not path:
                     print(f"{exe}: command not found")
-                    return
-                stdin_arg = prev_stdin if prev_stdin else (prev_stdout if prev_stdout else None)
+                    self.status = final = 127
+                    break
+                stdin_arg = subprocess.PIPE if prev_stdin else prev_stdout
                 stdout_arg = subprocess.PIPE if i < len(commands) - 1 else None
                 
                 try:
-                    proc = subprocess.Popen([exe] + args, stdin=stdin_arg, stdout=stdout_arg, executable=path)
-                    processes.append(proc)
-                    prev_stdout = proc.stdout
-                    prev_stdin = None 
+                    proc = subprocess.Popen([exe] + args, stdin=stdin_arg, stdout=stdout_arg, executable=path,
+                                            process_group=self.jobs.process_group(pgid), preexec_fn=self.jobs.preexec(background))
                 except Exception as e:
                     print(f"Error starting {exe}: {e}")
-                    return
-        
-        try:
-            for proc in processes:
-                proc.wait()
-        except KeyboardInterrupt:
-            for proc in processes:
-                proc.terminate()
-            print()
-
-    def execute_external(self, exe, args,out=sys.stdout):
+                    self.status = final = 126
+                    break
+                if prev_stdin:
+                    proc.stdin.write(prev_stdin)
+                    proc.stdin.close()
+                if prev_stdout:
+                    # only the child should hold the read end, so writers see SIGPIPE
+                    prev_stdout.close()
+                processes.append(proc)
+                pgid = pgid or proc.pid
+                prev_stdout = proc.stdout
+                prev_stdin = None 
+        if prev_stdout:
+            # nothing downstream reads it (missing command or builtin), so let the writer see SIGPIPE
+            prev_stdout.close()
+        if processes:
+            command = " | ".join(shlex.join(tokens) for tokens in commands)
+            self.status = self.jobs.start(processes, command, background)
+            if final is not None:
+                # the pipeline's status is its last stage's, which never became a process
+                self.status = final
+
+    def execute_external(self, exe, args,out=sys.stdout,background=False):
         path = self.find_exe(exe)
         if not path:
             print(f"{exe}: command not found",file=out)
+            self.status = 127
             return
         try:
-            subprocess.run([exe] + args, executable=path)
+            proc = subprocess.Popen([exe] + args, executable=path, process_group=self.jobs.process_group(),
+                                    preexec_fn=self.jobs.preexec(background))
         except FileNotFoundError:
             print(f"{exe}: command not found",file=out)
+            self.status = 127
+            return
         except PermissionError:
             print(f"{exe}: permission denied",file=out)
+            self.status = 126
+            return
         except Exception as e:
             print(f"{exe}: error: {e}",file=out)
+            self.status = 126
+            return
+        self.status = self.jobs.start([proc], shlex.join([exe] + args), background)
 
-    def dispatch(self, exe, args,out=sys.stdout):
+    def dispatch(self, exe, args,out=sys.stdout,background=False):
         try:
             if exe == "exit":
                 self.cmd_exit(args,out)
@@ -166,31 +271,69 @@ class MiniShell:
                 self.cmd_cd(args,out)
             elif exe == "type":
                 self.cmd_type(args,out)
+            elif exe == "jobs":
+                self.cmd_jobs(args,out)
+            elif exe == "fg":
+                self.cmd_fg(args,out)
+            elif exe == "bg":
+                self.cmd_bg(args,out)
+            elif exe == "wait":
+                self.cmd_wait(args,out)
+            elif exe == "set":
+                self.cmd_set(args,out)
             else:
-                self.execute_external(exe, args)
+                self.execute_external(exe, args, background=background)
         except SystemExit:
             raise
         except Exception as e:
             print(f"Error: {e}",file=out)
+            self.status = 1
+
+    def split_background(self, raw):
+        stripped = raw.rstrip()
+        if stripped.endswith("&") and not stripped.endswith("&&"):
+            return stripped[:-1], True
+        return raw, False
+
+    def execute(self, raw):
+        self.status = 0
+        started = self.trace.start() if self.trace else None
+        try:
+            line, background = self.split_background(raw)
+            if not line.strip():
+                if background:
+                    print("syntax error near unexpected token `&'")
+                    self.status = 2
+                return
+            if "|" in line:
+                temp=line.split("|")
+                c=[]
+                for i in temp:
+                    tokens=shlex.split(i)
+                    c.append(tokens) if tokens else None
+                self.exe_pipeline(c, background)
+            else:
+                tokens = shlex.split(line)
+                exe = tokens[0]
+                args = tokens[1:]
+                self.dispatch(exe, args, background=background)
+        except ValueError as e:
+            # shlex rejects the line (e.g. an unclosed quote); treat it as a syntax error.
+            print(f"hp.py: {e}", file=sys.stderr)
+            self.status = 2
+        finally:
+            if self.trace:
+                self.trace.record(raw, started, self.status)
 
     def run(self):
+        self.jobs.install()
         while True:
             try:
+                self.jobs.notify()
                 raw = input("$ ")
                 if not raw.strip():
                     continue
-                if "|" in raw:
-                    temp=raw.split("|")
-                    c=[]
-                    for i in temp:
-                        tokens=shlex.split(i)
-                        c.append(tokens) if tokens else None
-                        self.exe_pipeline(c)
-                else:
-                    tokens = shlex.split(raw)
-                    exe = tokens[0]
-                    args = tokens[1:]
-                    self.dispatch(exe, args)
+                self.execute(raw)
             except KeyboardInterrupt:
                 print()  
             except EOFError:
@@ -200,7 +343,67 @@ class MiniShell:
                 break
             except Exception as e:
                 print(f"Unexpected error: {e}")
+        return self.status
+
+    def run_script(self, lines):
+        self.jobs.install(interactive=False)
+        for raw in lines:
+            raw = raw.strip()
+            if not raw or raw.startswith("#"):
+                continue
+            try:
+                self.execute(raw)
+            except SystemExit:
+                break
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                self.status = 1
+            self.jobs.notify()
+            if self.errexit and self.status:
+                break
+        return self.status
+
+
+def main(argv):
+    usage = "usage: hp.py [-e] [-t TRACE] [-c COMMAND | SCRIPT]"
+    errexit, trace, command, script = False, os.getenv("SHELL_TIMING_TRACE"), None, None
+    args = iter(argv)
+    for arg in args:
+        if arg == "-e":
+            errexit = True
+        elif arg in ("-t", "--trace"):
+            trace = next(args, None)
+        elif arg == "-c":
+            command = next(args, None)
+            if command is None:
+                raise SystemExit(f"hp.py: -c: option requires an argument\n{usage}")
+            break
+        elif arg in ("-h", "--help"):
+            raise SystemExit(usage)
+        else:
+            script = arg
+            break
+    interactive = command is None and script is None and sys.stdin.isatty()
+    shell = MiniShell(interactive=interactive)
+    shell.errexit = errexit
+    shell.trace = TimingTrace(trace) if trace else None
+    try:
+        if command is not None:
+            return shell.run_script(command.splitlines())
+        if script is not None:
+            try:
+                f = open(script)
+            except OSError as e:
+                print(f"hp.py: {script}: {e.strerror}", file=sys.stderr)
+                return 127
+            with f:
+                return shell.run_script(f)
+        if not interactive:
+            return shell.run_script(sys.stdin)
+        return shell.run()
+    finally:
+        if shell.trace:
+            shell.trace.close()
 
 if __name__ == "__main__":
-    shell = MiniShell()
-    shell.run()
\ No newline at end of file
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,202 @@
+import os
+import sys
+import pty
+import json
+import time
+import select
+import signal
+import platform
+import argparse
+import statistics
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+SHELLS = {"main": HERE / "main.py", "hp": HERE / "app" / "hp.py"}
+PROMPT = b"$ "
+
+
+class PtyShell:
+    """One shell process driven through a pseudo-terminal, as a user would."""
+
+    def __init__(self, python, script, timeout=10.0):
+        self.timeout = timeout
+        env = dict(os.environ, TERM="dumb", INPUTRC="/dev/null")
+        env.pop("HISTFILE", None)
+        self.started = time.perf_counter()
+        self.pid, self.fd = pty.fork()
+        if self.pid == 0:
+            os.execve(python, [python, str(script)], env)
+        self.buffer = b""
+
+    def read_until(self, *patterns):
+        deadline = time.perf_counter() + self.timeout
+        while not any(p in self.buffer for p in patterns):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"waiting for {patterns!r}, got {self.buffer[-200:]!r}")
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if ready:
+                try:
+                    chunk = os.read(self.fd, 65536)
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    raise EOFError(f"shell exited, got {self.buffer[-200:]!r}")
+                self.buffer += chunk
+        hit = min((self.buffer.index(p), p) for p in patterns if p in self.buffer)
+        end = hit[0] + len(hit[1])
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return data
+
+    def send(self, data):
+        os.write(self.fd, data)
+
+    def run(self, command):
+        # The echoed input ends in "\r\n", so the prompt after the output is the next "\n$ ".
+        self.send(command.encode() + b"\n")
+        return self.read_until(b"\n" + PROMPT)
+
+    def close(self):
+        try:
+            self.send(b"exit\n")
+            os.waitpid(self.pid, 0)
+        except OSError:
+            os.kill(self.pid, signal.SIGKILL)
+            os.waitpid(self.pid, 0)
+        os.close(self.fd)
+
+
+def summarize(samples):
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "runs": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def bench_cold_start(python, script, runs):
+    samples = []
+    for _ in range(runs):
+        shell = PtyShell(python, script)
+        shell.read_until(PROMPT)
+        samples.append(time.perf_counter() - shell.started)
+        shell.close()
+    return summarize(samples)
+
+
+def bench_command(shell, command, runs):
+    samples = []
+    for i in range(runs):
+        start = time.perf_counter()
+        shell.run(command.format(i=i))
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_pipeline(shell, stages, size, runs):
+    command = " | ".join([f"head -c {size} /dev/zero"] + ["cat"] * (stages - 2) + ["wc -c"])
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = shell.run(command)
+        samples.append(time.perf_counter() - start)
+        if f"\n{size}\r\n".encode() not in output:
+            raise RuntimeError(f"pipeline produced {output!r}")
+    result = summarize(samples)
+    result.update({"stages": stages, "bytes": size, "mb_per_s": round(size / 1e6 / statistics.median(samples), 2)})
+    return result
+
+
+def bench_completion(shell, prefix, runs):
+    samples = []
+    for _ in range(runs):
+        shell.send(prefix.encode())
+        shell.read_until(prefix.encode())
+        start = time.perf_counter()
+        shell.send(b"\t")
+        shell.read_until(b" ", b"\x07")
+        samples.append(time.perf_counter() - start)
+        # Ctrl-U drops the completed word so the line runs as a no-op.
+        shell.send(b"\x15")
+        shell.run("")
+    return summarize(samples)
+
+
+def bench_shell(python, script, args):
+    result = {"cold_start": bench_cold_start(python, script, args.cold_runs)}
+    shell = PtyShell(python, script)
+    try:
+        shell.read_until(PROMPT)
+        result["builtin"] = bench_command(shell, "echo __bench_{i}__", args.runs)
+        result["spawn"] = bench_command(shell, "true", args.runs)
+        result["pipeline"] = bench_pipeline(shell, args.stages, args.bytes, args.pipeline_runs)
+        result["completion"] = bench_completion(shell, args.complete, args.runs)
+    finally:
+        shell.close()
+    return result
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for name, metrics in current["shells"].items():
+        for metric, values in metrics.items():
+            old = baseline.get("shells", {}).get(name, {}).get(metric)
+            if not old:
+                continue
+            if "mb_per_s" in values:
+                ratio = old["mb_per_s"] / values["mb_per_s"]
+            else:
+                ratio = values["median_ms"] / old["median_ms"]
+            if ratio > threshold:
+                regressions.append(f"{name}.{metric}: {ratio:.2f}x slower than baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and throughput benchmarks for the shells.")
+    parser.add_argument("--shell", action="append", choices=sorted(SHELLS), help="shell to run (default: all)")
+    parser.add_argument("--python", default=sys.executable, help="interpreter used to start the shells")
+    parser.add_argument("--runs", type=int, default=50, help="round trips per latency metric")
+    parser.add_argument("--cold-runs", type=int, default=10, help="shell starts for cold_start")
+    parser.add_argument("--pipeline-runs", type=int, default=5)
+    parser.add_argument("--stages", type=int, default=4, help="processes in the pipeline (>= 2)")
+    parser.add_argument("--bytes", type=int, default=64 * 1024 * 1024, help="bytes pushed through the pipeline")
+    parser.add_argument("--complete", default="ech", help="prefix completed with Tab")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON output to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+    if args.stages < 2:
+        parser.error("--stages must be at least 2")
+
+    report = {
+        "meta": {
+            "python": args.python,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "runs": args.runs,
+        },
+        "shells": {},
+    }
+    for name in args.shell or sorted(SHELLS):
+        report["shells"][name] = bench_shell(args.python, SHELLS[name], args)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
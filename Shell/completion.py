@@ -0,0 +1,56 @@
+import os
+from bisect import bisect_left
+
+# Sorts after every character, so bisecting on text + END bounds the prefix range.
+END = "\U0010ffff"
+
+
+def prefix_range(names: list[str], text: str) -> tuple[int, int]:
+    """Slice of the sorted ``names`` that start with ``text``."""
+    return bisect_left(names, text), bisect_left(names, text + END)
+
+
+class DirectoryListings:
+    """Sorted directory listings for path completion, shared by main.py and app/hp.py.
+
+    A listing is reused until its directory's mtime changes, so repeated Tab
+    presses bisect a cached list instead of rescanning the directory.
+    """
+
+    MAX_LISTINGS = 256
+
+    def __init__(self):
+        self.listings: dict[str, tuple[int, list[str], list[bool]]] = {}
+
+    def listing(self, directory: str) -> tuple[list[str], list[bool]]:
+        directory = os.path.abspath(directory)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return [], []
+        cached = self.listings.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted((entry.name, entry.is_dir()) for entry in it)
+        except OSError:
+            return [], []
+        if len(self.listings) >= self.MAX_LISTINGS:
+            self.listings.clear()
+        names = [name for name, _ in entries]
+        is_dir = [flag for _, flag in entries]
+        self.listings[directory] = (mtime, names, is_dir)
+        return names, is_dir
+
+    def complete(self, text: str, file_suffix: str = " ") -> list[str]:
+        """Paths starting with ``text``; directories end in "/" and files in ``file_suffix``."""
+        partial = text.rpartition("/")[2]
+        head = text[:len(text) - len(partial)]
+        names, is_dir = self.listing(os.path.expanduser(head) or ".")
+        lo, hi = prefix_range(names, partial)
+        return [
+            head + names[i] + ("/" if is_dir[i] else file_suffix)
+            for i in range(lo, hi)
+            if partial.startswith(".") or not names[i].startswith(".")
+        ]
@@ -0,0 +1,230 @@
+import os
+import sys
+import signal
+import subprocess
+
+
+class Job:
+    """A command or pipeline; ``pgid`` is None when it shares the shell's process group."""
+
+    def __init__(self, pgid: int | None, processes: list[subprocess.Popen], command: str):
+        self.job_id = 0
+        self.pgid = pgid
+        self.processes = processes
+        self.command = command
+        self.stopped: set[int] = set()
+
+    @property
+    def done(self) -> bool:
+        return all(proc.returncode is not None for proc in self.processes)
+
+    @property
+    def status(self) -> int:
+        code = self.processes[-1].returncode if self.processes else 0
+        if code is None:
+            return 0
+        return 128 - code if code < 0 else code
+
+    @property
+    def state(self) -> str:
+        if self.done:
+            code = self.processes[-1].returncode
+            if code < 0:
+                return signal.strsignal(-code) or "Killed"
+            return "Done" if code == 0 else f"Exit {code}"
+        return "Stopped" if self.stopped else "Running"
+
+    def update(self, pid: int, status: int) -> None:
+        if os.WIFSTOPPED(status):
+            self.stopped.add(pid)
+            return
+        if os.WIFCONTINUED(status):
+            self.stopped.discard(pid)
+            return
+        self.stopped.discard(pid)
+        for proc in self.processes:
+            if proc.pid == pid:
+                proc.returncode = os.waitstatus_to_exitcode(status)
+
+
+class JobTable:
+    """Background and stopped jobs, reaped from SIGCHLD instead of polling.
+
+    Shared by main.py and app/hp.py. With job control (an interactive shell
+    on a terminal) each pipeline or command runs in its own process group,
+    which is handed the terminal while in the foreground. Without it, children
+    stay in the shell's group, as in bash, so they can still read the tty.
+    """
+
+    def __init__(self):
+        self.jobs: dict[int, Job] = {}
+        self.foreground: Job | None = None
+        self.terminal: int | None = None
+        self.interactive = False
+
+    def install(self, interactive: bool = True) -> None:
+        signal.signal(signal.SIGCHLD, self.reap)
+        signal.signal(signal.SIGHUP, self.hangup)
+        self.interactive = interactive
+        if interactive and sys.stdin.isatty():
+            self.terminal = sys.stdin.fileno()
+            # Handlers rather than SIG_IGN so exec'd children get the defaults back.
+            signal.signal(signal.SIGTSTP, self.ignore)
+            signal.signal(signal.SIGQUIT, self.ignore)
+
+    @staticmethod
+    def ignore(signum, frame) -> None:
+        pass
+
+    def give_terminal(self, pgid: int) -> None:
+        if self.terminal is None:
+            return
+        old = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTTOU})
+        try:
+            os.tcsetpgrp(self.terminal, pgid)
+        except OSError:
+            pass
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, old)
+
+    def claim_terminal(self) -> None:
+        # Runs in the child so it owns the tty before it can read from it.
+        self.give_terminal(os.getpgrp())
+
+    def preexec(self, background: bool):
+        """``preexec_fn`` for a new process group's first process."""
+        return None if background or self.terminal is None else self.claim_terminal
+
+    def process_group(self, pgid: int = 0) -> int | None:
+        """``process_group`` for Popen: join ``pgid`` (0 for a new group) only under job control."""
+        return None if self.terminal is None else pgid
+
+    def launch(self, args: list[str] | str, command: str, background: bool, shell: bool = False) -> int:
+        proc = subprocess.Popen(args, shell=shell, process_group=self.process_group(),
+                                preexec_fn=self.preexec(background))
+        return self.start([proc], command, background)
+
+    def start(self, processes: list[subprocess.Popen], command: str, background: bool) -> int:
+        """Track processes already started by the caller; wait unless ``background``."""
+        job = Job(processes[0].pid if self.terminal is not None else None, processes, command)
+        if background:
+            self.add(job)
+            if self.interactive:
+                print(f"[{job.job_id}] {processes[-1].pid}")
+            return 0
+        return self.wait(job, foreground=True)
+
+    def add(self, job: Job) -> None:
+        job.job_id = max(self.jobs, default=0) + 1
+        self.jobs[job.job_id] = job
+        # A child that exited before it was registered already raised its SIGCHLD.
+        self.reap()
+
+    @staticmethod
+    def collect(job: Job, options: int) -> bool:
+        if job.pgid is not None:
+            target, pending = -job.pgid, job.processes
+        else:
+            pending = [next(proc for proc in job.processes if proc.returncode is None)]
+            target = pending[0].pid
+        try:
+            pid, status = os.waitpid(target, options)
+        except ChildProcessError:
+            # Nothing left to wait for; a SIGCHLD handler may have reaped it meanwhile.
+            for proc in pending:
+                if proc.returncode is None:
+                    proc.returncode = 0
+            return False
+        if pid:
+            job.update(pid, status)
+        return bool(pid)
+
+    def reap(self, signum=None, frame=None) -> None:
+        options = os.WNOHANG | os.WUNTRACED | os.WCONTINUED
+        for job in list(self.jobs.values()):
+            if job is self.foreground:
+                continue
+            while not job.done and self.collect(job, options):
+                pass
+
+    def wait(self, job: Job, foreground: bool = False) -> int:
+        self.foreground = job
+        if foreground:
+            self.give_terminal(job.pgid)
+        try:
+            while not job.done and not job.stopped:
+                try:
+                    self.collect(job, os.WUNTRACED)
+                except KeyboardInterrupt:
+                    if not foreground:
+                        print()
+                        return 130
+                    self.signal(job, signal.SIGINT)
+        finally:
+            self.foreground = None
+            if foreground:
+                self.give_terminal(os.getpgrp())
+        if job.stopped:
+            if not job.job_id:
+                self.add(job)
+            print(f"\n[{job.job_id}]+  {job.state:<24}{job.command}")
+            return 128 + signal.SIGTSTP
+        self.jobs.pop(job.job_id, None)
+        return job.status
+
+    def resume(self, job: Job, foreground: bool = False) -> int:
+        job.stopped.clear()
+        if foreground:
+            self.foreground = job
+            self.give_terminal(job.pgid)
+        self.signal(job, signal.SIGCONT)
+        return self.wait(job, foreground=True) if foreground else 0
+
+    @staticmethod
+    def signal(job: Job, signum: int) -> None:
+        try:
+            if job.pgid is not None:
+                os.killpg(job.pgid, signum)
+                return
+        except ProcessLookupError:
+            return
+        for proc in job.processes:
+            if proc.returncode is None:
+                try:
+                    os.kill(proc.pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def find(self, spec: str | None) -> Job | None:
+        if not self.jobs:
+            return None
+        if spec in (None, "%", "%%", "%+"):
+            return self.jobs[max(self.jobs)]
+        if spec == "%-":
+            ids = sorted(self.jobs)
+            return self.jobs[ids[-2]] if len(ids) > 1 else None
+        try:
+            return self.jobs.get(int(spec.removeprefix("%")))
+        except ValueError:
+            return None
+
+    def format(self, job: Job) -> str:
+        ids = sorted(self.jobs)
+        marker = "+" if job.job_id == ids[-1] else "-" if len(ids) > 1 and job.job_id == ids[-2] else " "
+        suffix = " &" if job.state == "Running" else ""
+        return f"[{job.job_id}]{marker}  {job.state:<24}{job.command}{suffix}"
+
+    def notify(self, out=None) -> None:
+        if not self.interactive:
+            # As in bash, a script keeps finished jobs so a later ``wait`` or ``jobs`` still sees them.
+            return
+        for job in [job for job in self.jobs.values() if job.done]:
+            print(self.format(job), file=out)
+            del self.jobs[job.job_id]
+
+    def hangup(self, signum, frame) -> None:
+        for job in self.jobs.values():
+            self.signal(job, signal.SIGHUP)
+            if job.stopped:
+                self.signal(job, signal.SIGCONT)
+        raise SystemExit(128 + signum)
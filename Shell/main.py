@@ -1,42 +1,63 @@
 import os
 import sys
+import time
 import shlex
-import subprocess
+import fcntl
 import shutil
 import readline
+from array import array
+from bisect import bisect_right
 from pathlib import Path
 
+from completion import DirectoryListings, prefix_range
+from jobcontrol import JobTable
+from timing import TimingTrace
+
 class Autocompleter:
-    available_commands = ("echo", "type", "exit", "pwd", "cd", "history")
+    available_commands = ("echo", "type", "exit", "pwd", "cd", "history", "jobs", "fg", "bg", "wait", "set")
 
     def __init__(self):
-        self.options = self.get_options()
+        self._options: list[str] | None = None
+        self.listings = DirectoryListings()
         self.matches = []
 
+    @property
+    def options(self) -> list[str]:
+        if self._options is None:
+            self._options = self.get_options()
+        return self._options
+
     def get_options(self):
-        options = list(self.available_commands)
-        options.extend(self._get_path_executable())
-        return options
+        options = set(self.available_commands)
+        options.update(self._get_path_executable())
+        return sorted(options)
 
     @staticmethod
     def _get_path_executable():
         for path in os.environ["PATH"].split(os.pathsep):
-            path = Path(path)
-            if path.exists():
-                for file in path.iterdir():
-                    if file.is_file() and shutil.which(file.name):
-                        yield file.name
+            try:
+                with os.scandir(path or ".") as entries:
+                    for entry in entries:
+                        if entry.is_file() and os.access(entry.path, os.X_OK):
+                            yield entry.name
+            except OSError:
+                continue
+
+    def complete_command(self, text: str) -> list[str]:
+        lo, hi = prefix_range(self.options, text)
+        return [f"{option} " for option in self.options[lo:hi]]
+
+    def find_matches(self, text: str, first_word: bool) -> list[str]:
+        if first_word and "/" not in text:
+            return self.complete_command(text)
+        return self.listings.complete(text)
 
     def complete(self, text, state):
         if state == 0:
-            if text:
-                self.matches = [
-                    option for option in self.options if option.startswith(text)
-                ]
-            else:
-                self.matches = self.options[:]
+            first_word = not readline.get_line_buffer()[:readline.get_begidx()].strip()
+            self.matches = self.find_matches(text, first_word)
         if state < len(self.matches):
-            return f"{self.matches[state]} "
+            return self.matches[state]
         else:
             return None
 
@@ -47,17 +68,228 @@ class Autocompleter:
         print("$ " + readline.get_line_buffer(), end="", flush=True)
 
 
-completer = Autocompleter()
-readline.set_completer(completer.complete)
-readline.set_completion_display_matches_hook(Autocompleter.complete_hook)
-readline.parse_and_bind("tab: complete")
-readline.set_auto_history(False)
-HISTORY = []
+def setup_readline() -> None:
+    completer = Autocompleter()
+    readline.set_completer(completer.complete)
+    readline.set_completion_display_matches_hook(Autocompleter.complete_hook)
+    readline.set_completer_delims(" \t\n")
+    readline.parse_and_bind("tab: complete")
+    readline.set_auto_history(False)
+
+
+class HistoryStore:
+    """Shell history appended to HISTFILE as it is entered.
+
+    Full entry blocks are sealed into newline-joined text with an offsets
+    array, so the ``history -f`` search command runs ``str.rfind`` over each
+    block instead of a Python loop over every entry (readline's own Ctrl-R
+    search does not use it). Blocks are about an eighth of the limit, so a
+    search is a few ``rfind`` calls plus a short loop over the unsealed tail,
+    and entries are trimmed back to the limit once they reach twice it.
+    A negative limit keeps everything; zero records nothing.
+    """
+
+    BLOCK = 4096
+    MIN_BLOCK = 64
+
+    def __init__(self, limit: int = 1000, sync_every: int = 32, sync_interval: float = 1.0):
+        self.entries: list[str] = []
+        self.limit = limit
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.block = self.BLOCK if limit <= 0 else min(self.BLOCK, max(self.MIN_BLOCK, limit // 8))
+        self.blocks: list[tuple[int, str, array]] = []
+        self.sealed = 0
+        self.path: str | None = None
+        self.file = None
+        self.file_lines = 0
+        self.unsynced = 0
+        self.last_sync = 0.0
+        self.appended: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return self.entries[i]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def open(self, path: str) -> None:
+        self.path = os.path.expanduser(path)
+        try:
+            with open(self.path, "r") as f:
+                lines = [line for line in f.read().splitlines() if line.strip()]
+        except (FileNotFoundError, PermissionError, OSError):
+            lines = []
+        self.file_lines = len(lines)
+        self.extend(lines[max(0, len(lines) - self.limit):] if self.limit >= 0 else lines)
+        try:
+            self.file = open(self.path, "a")
+        except OSError:
+            self.file = None
+        self.last_sync = time.monotonic()
+
+    def extend(self, lines) -> None:
+        for line in lines:
+            if not self.entries or self.entries[-1] != line:
+                self.entries.append(line)
+        if self.limit > 0 and len(self.entries) > 2 * self.limit:
+            self.trim()
+        self.seal()
+
+    def add(self, entry: str) -> bool:
+        if not self.limit or (self.entries and self.entries[-1] == entry):
+            return False
+        self.entries.append(entry)
+        if self.limit > 0 and len(self.entries) > 2 * self.limit:
+            self.trim()
+        self.seal()
+        if self.lock():
+            try:
+                self.file.write(entry + "\n")
+                self.file.flush()
+            finally:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file_lines += 1
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+                self.sync()
+            if self.limit > 0 and self.file_lines > 2 * self.limit:
+                self.compact()
+        return True
+
+    def sync(self) -> None:
+        if self.file is None or not self.unsynced:
+            return
+        try:
+            os.fsync(self.file.fileno())
+        except OSError:
+            pass
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def lock(self) -> bool:
+        """Lock HISTFILE for writing, first reopening it if another session compacted it."""
+        while self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self.file.fileno()).st_ino:
+                    return True
+            except OSError:
+                pass
+            # Closing drops the lock on the replaced file.
+            self.file.close()
+            try:
+                self.file = open(self.path, "a")
+            except OSError:
+                self.file = None
+        return False
+
+    def compact(self) -> None:
+        # Under the lock, lines other sessions appended are re-read and kept; they
+        # reopen the new file before their next write (see lock).
+        self.sync()
+        if not self.lock():
+            return
+        try:
+            with open(self.path, "r") as f:
+                lines = f.read().splitlines()[-self.limit:]
+            self.write(self.path, lines)
+        except OSError:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            return
+        self.file.close()
+        self.file = open(self.path, "a")
+        self.file_lines = len(lines)
+        self.trim()
+
+    def close(self) -> None:
+        if self.file is None:
+            return
+        self.sync()
+        if self.limit > 0 and self.file_lines > 2 * self.limit:
+            self.compact()
+        self.file.close()
+        self.file = None
+
+    @staticmethod
+    def write(path: str, lines: list[str]) -> None:
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            f.writelines(line + "\n" for line in lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def append_to(self, path: str) -> None:
+        start = self.appended.get(path, 0)
+        with open(path, "a") as f:
+            f.writelines(line + "\n" for line in self.entries[start:])
+        self.appended[path] = len(self.entries)
+
+    def trim(self) -> None:
+        """Drop all but the newest ``limit`` entries and re-seal what is left."""
+        drop = len(self.entries) - self.limit
+        if self.limit < 0 or drop <= 0:
+            return
+        del self.entries[:drop]
+        self.appended = {path: max(0, n - drop) for path, n in self.appended.items()}
+        self.blocks.clear()
+        self.sealed = 0
+        self.seal()
+
+    def seal(self) -> None:
+        while len(self.entries) - self.sealed >= self.block:
+            chunk = self.entries[self.sealed:self.sealed + self.block]
+            offsets = array("I")
+            pos = 1
+            for line in chunk:
+                offsets.append(pos)
+                pos += len(line) + 1
+            self.blocks.append((self.sealed, "\n" + "\n".join(chunk) + "\n", offsets))
+            self.sealed += self.block
+
+    def search(self, text: str, prefix: bool = False):
+        """Yield indexes of entries containing (or starting with) text, newest first."""
+        if not text:
+            # Every entry matches, and rfind("") would never move past the block start.
+            yield from range(len(self.entries) - 1, -1, -1)
+            return
+        for i in range(len(self.entries) - 1, self.sealed - 1, -1):
+            line = self.entries[i]
+            if line.startswith(text) if prefix else text in line:
+                yield i
+        needle = "\n" + text if prefix else text
+        for first, blob, offsets in reversed(self.blocks):
+            end = len(blob) - 1
+            while (pos := blob.rfind(needle, 0, end)) != -1:
+                k = bisect_right(offsets, pos + 1 if prefix else pos) - 1
+                yield first + k
+                end = offsets[k] - 1
+
+
+def history_size(default: int = 1000) -> int:
+    try:
+        return int(os.getenv("HISTSIZE") or default)
+    except ValueError:
+        return default
+
+
+HISTORY = HistoryStore(limit=history_size())
+
+
+JOBS = JobTable()
 
 
 class CommandHandler:
     TYPE_TEMPLATE = "{arg} is a shell builtin"
-    TYPES_BUILTIN = {"history", "echo", "type", "exit", "pwd"}
+    TYPES_BUILTIN = {"history", "echo", "type", "exit", "pwd", "jobs", "fg", "bg", "wait", "set"}
+
+    def __init__(self):
+        self.status = 0
+        self.errexit = False
 
     @staticmethod
     def split_command(command: str) -> tuple[str, str]:
@@ -76,6 +308,13 @@ class CommandHandler:
     def is_a_pipe(command: str) -> bool:
         return "|" in command
 
+    @staticmethod
+    def split_background(command: str) -> tuple[str, bool]:
+        stripped = command.rstrip()
+        if stripped.endswith("&") and not stripped.endswith("&&"):
+            return stripped[:-1].rstrip(), True
+        return command, False
+
     @staticmethod
     def handle_echo(arg: str) -> bool:
         print(f"{" ".join(arg)}")
@@ -89,6 +328,7 @@ class CommandHandler:
             print(pathname)
         else:
             print(f"{arg}: not found")
+            self.status = 1
         return False
 
     @staticmethod
@@ -96,10 +336,65 @@ class CommandHandler:
         print(os.getcwd())
         return False
 
-    @staticmethod
-    def handle_exec(command: str, arg: str) -> bool:
+    def handle_exec(self, command: str, arg: str, background: bool = False) -> bool:
         args = [command, *arg]
-        subprocess.run(args)
+        self.status = JOBS.launch(args, shlex.join(args), background)
+        return False
+
+    @staticmethod
+    def handle_jobs() -> bool:
+        for job in list(JOBS.jobs.values()):
+            print(JOBS.format(job))
+            if job.done:
+                del JOBS.jobs[job.job_id]
+        return False
+
+    def handle_fg(self, arg: list[str]) -> bool:
+        spec = arg[0] if arg else None
+        job = JOBS.find(spec)
+        if job is None:
+            print(f"fg: {spec or 'current'}: no such job")
+            self.status = 1
+            return False
+        print(job.command)
+        self.status = JOBS.resume(job, foreground=True)
+        return False
+
+    def handle_bg(self, arg: list[str]) -> bool:
+        spec = arg[0] if arg else None
+        job = JOBS.find(spec)
+        if job is None:
+            print(f"bg: {spec or 'current'}: no such job")
+            self.status = 1
+            return False
+        JOBS.resume(job)
+        print(f"[{job.job_id}]+ {job.command} &")
+        return False
+
+    def handle_wait(self, arg: list[str]) -> bool:
+        if not arg:
+            for job in list(JOBS.jobs.values()):
+                if not job.stopped:
+                    JOBS.wait(job)
+            return False
+        for spec in arg:
+            job = JOBS.find(spec)
+            if job is None and spec.isdigit():
+                job = next((j for j in JOBS.jobs.values() if int(spec) in (p.pid for p in j.processes)), None)
+            if job is None:
+                print(f"wait: {spec}: no such job")
+                self.status = 127
+                continue
+            self.status = JOBS.wait(job)
+        return False
+
+    def handle_set(self, arg: list[str]) -> bool:
+        for option in arg:
+            if option in ("-e", "+e"):
+                self.errexit = option == "-e"
+            else:
+                print(f"set: {option}: invalid option")
+                self.status = 2
         return False
         
     @staticmethod
@@ -113,33 +408,36 @@ class CommandHandler:
             fn = arg[1]
             try:
                 with open(os.path.expanduser(fn), "r") as f:
-                    for line in f:
-                        line = line.strip()
-                        if line:
-                            HISTORY.append(line)
-                            readline.add_history(line)
+                    lines = [line.strip() for line in f if line.strip()]
+                HISTORY.extend(lines)
+                for line in lines:
+                    readline.add_history(line)
             except (FileNotFoundError, PermissionError, OSError):
                 pass
             return False
         if len(arg) == 2 and arg[0] == "-w":
             fn = arg[1]
             try:
-                with open(os.path.expanduser(fn), "w") as f:
-                    for i in HISTORY:
-                        f.write(i + "\n")
+                HISTORY.write(os.path.expanduser(fn), HISTORY.entries)
             except (PermissionError, OSError):
                 print(f"history: cannot write {fn}")
             return False
         if len(arg) == 2 and arg[0] == "-a":
             fn = arg[1]
             try:
-                with open(os.path.expanduser(fn), "a") as f:
-                    for i in HISTORY:
-                        f.write(i + "\n")
-                HISTORY.clear()
+                HISTORY.append_to(os.path.expanduser(fn))
             except (PermissionError, OSError):
                 print(f"history: cannot append to {fn}")
             return False
+        if len(arg) == 2 and arg[0] == "-f":
+            text = arg[1]
+            prefix = text.startswith("^")
+            seen = set()
+            for i in HISTORY.search(text[1:] if prefix else text, prefix):
+                if HISTORY[i] not in seen:
+                    seen.add(HISTORY[i])
+                    print(f"    {i+1}  {HISTORY[i]}")
+            return False
         try:
             n = int(arg[0])
             if n <= 0:
@@ -153,31 +451,46 @@ class CommandHandler:
             print("history: invalid argument")
         return False
     
-    @staticmethod
-    def handle_cd(arg: str) -> bool:
+    def handle_cd(self, arg: str) -> bool:
         arg = Path("".join(arg))
         try:
             os.chdir(arg.expanduser())
         except FileNotFoundError:
             print(f"cd: {arg}: No such file or directory")
+            self.status = 1
         return False
 
-    @staticmethod
-    def subprocess_call(command: str) -> bool:
-        subprocess.call(command, shell=True)
+    def subprocess_call(self, command: str, background: bool = False) -> bool:
+        self.status = JOBS.launch(command, command, background, shell=True)
         return False
 
-    @staticmethod
-    def handle_default(command: str) -> bool:
+    def handle_default(self, command: str) -> bool:
         print(f"{command}: command not found")
+        self.status = 127
         return False
 
+    def handle_exit(self, arg: list[str]) -> bool:
+        if arg:
+            try:
+                self.status = int(arg[0]) & 0xFF
+            except ValueError:
+                print(f"exit: {arg[0]}: numeric argument required")
+                self.status = 2
+        return True
+
     def handle_command(self, command: str) -> bool:
+        self.status = 0
+        command, background = self.split_background(command)
+        if not command.strip():
+            if background:
+                print("syntax error near unexpected token `&'")
+                self.status = 2
+            return False
         if self.is_a_redirect(command) or self.is_a_pipe(command):
-            return self.subprocess_call(command)
+            return self.subprocess_call(command, background)
         match self.split_command(command):
-            case ("exit", _):
-                return True
+            case ("exit", arg):
+                return self.handle_exit(arg)
             case ("history", arg):
                 return self.handle_history(arg)
             case ("echo", arg):
@@ -188,44 +501,129 @@ class CommandHandler:
                 return self.handle_pwd()
             case ("cd", arg):
                 return self.handle_cd(arg)
+            case ("jobs", _):
+                return self.handle_jobs()
+            case ("fg", arg):
+                return self.handle_fg(arg)
+            case ("bg", arg):
+                return self.handle_bg(arg)
+            case ("wait", arg):
+                return self.handle_wait(arg)
+            case ("set", arg):
+                return self.handle_set(arg)
             case (command, arg):
                 if self.find_executable(command):
-                    return self.handle_exec(command, arg)
+                    return self.handle_exec(command, arg, background)
                 return self.handle_default(command)
         return False
 
 
-def main() -> None:
+USAGE = "usage: main.py [-e] [-t TRACE] [-c COMMAND | SCRIPT]"
+
+
+def parse_args(argv: list[str]) -> dict:
+    options = {"errexit": False, "trace": os.getenv("SHELL_TIMING_TRACE"), "command": None, "script": None}
+    args = iter(argv)
+    for arg in args:
+        match arg:
+            case "-e":
+                options["errexit"] = True
+            case "-t" | "--trace":
+                options["trace"] = next(args, None)
+            case "-c":
+                options["command"] = next(args, None)
+                if options["command"] is None:
+                    raise SystemExit(f"main.py: -c: option requires an argument\n{USAGE}")
+                break
+            case "-h" | "--help":
+                raise SystemExit(USAGE)
+            case _:
+                options["script"] = arg
+                break
+    return options
+
+
+def run_line(handler: CommandHandler, line: str, trace: TimingTrace | None) -> bool:
+    started = trace.start() if trace else None
+    try:
+        should_exit = handler.handle_command(line)
+    except ValueError as e:
+        # shlex rejects the line (e.g. an unclosed quote); treat it as a syntax error.
+        print(f"main.py: {e}", file=sys.stderr)
+        handler.status, should_exit = 2, False
+    if trace:
+        trace.record(line, started, handler.status)
+    return should_exit
+
+
+def run_commands(handler: CommandHandler, lines, trace: TimingTrace | None) -> int:
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        should_exit = run_line(handler, line, trace)
+        JOBS.notify()
+        if should_exit or (handler.errexit and handler.status):
+            break
+    return handler.status
+
+
+def run_interactive(handler: CommandHandler, trace: TimingTrace | None) -> int:
+    setup_readline()
     history_file = os.getenv("HISTFILE")
     if history_file:
-        try:
-            with open(os.path.expanduser(history_file), "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        HISTORY.append(line)
-                        readline.add_history(line)
-        except (FileNotFoundError, PermissionError, OSError):
-            pass
+        HISTORY.open(history_file)
+        for line in HISTORY:
+            readline.add_history(line)
+    JOBS.install()
     while True:
-        user_input = input("$ ")
-        if user_input.strip():
-            HISTORY.append(user_input)
+        JOBS.notify()
+        try:
+            user_input = input("$ ")
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            # Ctrl-C drops the line being typed; the shell and its jobs keep running.
+            print()
+            handler.status = 130
+            continue
+        if not user_input.strip():
+            continue
+        if HISTORY.add(user_input):
             readline.add_history(user_input)
-        should_exit = CommandHandler().handle_command(user_input)
-        if should_exit:
+        if run_line(handler, user_input, trace):
             break
-    if history_file:
-        try:
-            max_history = 1000
-            if len(HISTORY) > max_history:
-                HISTORY[:] = HISTORY[-max_history:]
-            with open(os.path.expanduser(history_file), "w") as f:
-                for item in HISTORY:
-                    f.write(item + "\n")
-        except (OSError, PermissionError):
-            pass
+    HISTORY.close()
+    return handler.status
+
+
+def main(argv: list[str] | None = None) -> int:
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    handler = CommandHandler()
+    handler.errexit = options["errexit"]
+    trace = TimingTrace(options["trace"]) if options["trace"] else None
+    try:
+        if options["command"] is not None:
+            JOBS.install(interactive=False)
+            return run_commands(handler, options["command"].splitlines(), trace)
+        if options["script"] is not None:
+            try:
+                script = open(options["script"])
+            except OSError as e:
+                print(f"main.py: {options['script']}: {e.strerror}", file=sys.stderr)
+                return 127
+            JOBS.install(interactive=False)
+            with script:
+                return run_commands(handler, script, trace)
+        if not sys.stdin.isatty():
+            JOBS.install(interactive=False)
+            return run_commands(handler, sys.stdin, trace)
+        return run_interactive(handler, trace)
+    finally:
+        if trace:
+            trace.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,409 @@
+import unittest
+import tempfile
+import os
+import sys
+import json
+import shutil
+import subprocess
+import pty
+import time
+from unittest.mock import patch
+from main import HistoryStore, Autocompleter
+from jobcontrol import JobTable
+from completion import DirectoryListings, prefix_range
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+from hp import MiniShell
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SHELLS = {"main": os.path.join(HERE, "main.py"), "hp": os.path.join(HERE, "app", "hp.py")}
+
+
+def run_shell(shell, *args, stdin=None):
+    return subprocess.run([sys.executable, SHELLS[shell], *args], input=stdin, capture_output=True,
+                          text=True, timeout=10)
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "history")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def read_lines(self):
+        with open(self.path) as f:
+            return f.read().splitlines()
+
+    def test_add_appends_to_file_immediately(self):
+        store = HistoryStore()
+        store.open(self.path)
+        store.add("echo one")
+        store.add("echo two")
+        self.assertEqual(self.read_lines(), ["echo one", "echo two"])
+        store.close()
+
+    def test_consecutive_duplicates_are_dropped(self):
+        store = HistoryStore()
+        self.assertTrue(store.add("ls"))
+        self.assertFalse(store.add("ls"))
+        self.assertTrue(store.add("pwd"))
+        self.assertTrue(store.add("ls"))
+        self.assertEqual(list(store), ["ls", "pwd", "ls"])
+
+    def test_open_loads_only_the_newest_entries(self):
+        with open(self.path, "w") as f:
+            f.writelines(f"cmd {i}\n" for i in range(50))
+        store = HistoryStore(limit=10)
+        store.open(self.path)
+        self.assertEqual(store[0], "cmd 40")
+        self.assertEqual(len(store), 10)
+        store.close()
+
+    def test_file_is_compacted_past_twice_the_limit(self):
+        store = HistoryStore(limit=5)
+        store.open(self.path)
+        for i in range(11):
+            store.add(f"cmd {i}")
+        self.assertEqual(self.read_lines(), [f"cmd {i}" for i in range(6, 11)])
+        store.add("cmd 11")
+        self.assertEqual(self.read_lines()[-1], "cmd 11")
+        store.close()
+
+    def test_other_sessions_follow_a_compacted_file(self):
+        first, second = HistoryStore(limit=5), HistoryStore(limit=5)
+        first.open(self.path)
+        second.open(self.path)
+        second.add("from second")
+        for i in range(11):
+            first.add(f"cmd {i}")
+        self.assertNotIn("from second", self.read_lines())
+        second.add("after compaction")
+        first.add("last")
+        self.assertEqual(self.read_lines()[-2:], ["after compaction", "last"])
+        first.close()
+        second.close()
+
+    def test_close_does_not_rewrite_a_full_file(self):
+        with open(self.path, "w") as f:
+            f.writelines(f"cmd {i}\n" for i in range(10))
+        inode = os.stat(self.path).st_ino
+        store = HistoryStore(limit=10)
+        store.open(self.path)
+        store.add("one more")
+        store.close()
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(len(self.read_lines()), 11)
+
+    def test_append_to_writes_only_new_entries(self):
+        store = HistoryStore()
+        other = os.path.join(self.temp_dir, "other")
+        store.add("a")
+        store.append_to(other)
+        store.add("b")
+        store.append_to(other)
+        with open(other) as f:
+            self.assertEqual(f.read().splitlines(), ["a", "b"])
+        self.assertEqual(list(store), ["a", "b"])
+
+    def test_search_newest_first_across_blocks(self):
+        store = HistoryStore(limit=-1)
+        store.extend(f"echo {i}" for i in range(HistoryStore.BLOCK * 2 + 10))
+        self.assertEqual(len(store.blocks), 2)
+        hits = list(store.search("echo 1"))
+        self.assertEqual(hits, sorted(hits, reverse=True))
+        self.assertEqual(hits, [i for i in reversed(range(len(store))) if "echo 1" in store[i]])
+
+    def test_blocks_are_sized_to_the_limit(self):
+        store = HistoryStore(limit=1000)
+        store.extend(f"echo {i}" for i in range(300))
+        self.assertEqual(len(store.blocks), 2)
+        self.assertEqual(list(store.search("echo 12")),
+                         [i for i in reversed(range(len(store))) if "echo 12" in store[i]])
+
+    def test_entries_are_trimmed_to_the_limit(self):
+        store = HistoryStore(limit=100)
+        other = os.path.join(self.temp_dir, "other")
+        for i in range(150):
+            store.add(f"cmd {i}")
+        store.append_to(other)
+        for i in range(150, 201):
+            store.add(f"cmd {i}")
+        self.assertEqual(list(store), [f"cmd {i}" for i in range(101, 201)])
+        self.assertEqual(list(store.search("cmd 15", prefix=True)), [i - 101 for i in range(159, 149, -1)])
+        store.append_to(other)
+        with open(other) as f:
+            self.assertEqual(f.read().splitlines(), [f"cmd {i}" for i in range(201)])
+
+    def test_empty_search_lists_everything(self):
+        store = HistoryStore(limit=-1)
+        store.extend(f"echo {i}" for i in range(HistoryStore.BLOCK + 3))
+        expected = list(reversed(range(len(store))))
+        self.assertEqual(list(store.search("")), expected)
+        self.assertEqual(list(store.search("", prefix=True)), expected)
+
+    def test_prefix_search(self):
+        store = HistoryStore(limit=-1)
+        store.extend(["git status", "echo git", "git log"] * HistoryStore.BLOCK)
+        hits = list(store.search("git", prefix=True))
+        self.assertEqual(len(hits), 2 * HistoryStore.BLOCK)
+        self.assertTrue(all(store[i].startswith("git") for i in hits))
+
+
+class TestAutocompleter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.bin_dir = os.path.join(self.temp_dir, "bin")
+        os.makedirs(self.bin_dir)
+        for name in ("grep", "grepx", "gzip", "notexec"):
+            path = os.path.join(self.bin_dir, name)
+            with open(path, "w") as f:
+                f.write("#!/bin/sh\n")
+            os.chmod(path, 0o644 if name == "notexec" else 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def make_completer(self):
+        with patch.dict(os.environ, {"PATH": self.bin_dir}):
+            completer = Autocompleter()
+            completer.options
+        return completer
+
+    def test_command_prefix(self):
+        completer = self.make_completer()
+        self.assertEqual(completer.find_matches("gre", True), ["grep ", "grepx "])
+        self.assertEqual(completer.find_matches("ec", True), ["echo "])
+        self.assertEqual(completer.find_matches("notex", True), [])
+
+    def test_path_completion_for_arguments(self):
+        completer = self.make_completer()
+        os.makedirs(os.path.join(self.temp_dir, "docs"))
+        open(os.path.join(self.temp_dir, "data.txt"), "w").close()
+        open(os.path.join(self.temp_dir, ".hidden"), "w").close()
+        head = self.temp_dir + "/"
+        self.assertEqual(completer.find_matches(head + "d", False), [head + "data.txt ", head + "docs/"])
+        self.assertEqual(completer.find_matches(head + ".", False), [head + ".hidden "])
+
+    def test_listing_is_refreshed_when_directory_changes(self):
+        completer = self.make_completer()
+        head = self.temp_dir + "/"
+        self.assertEqual(completer.find_matches(head + "n", False), [])
+        open(os.path.join(self.temp_dir, "new.txt"), "w").close()
+        os.utime(self.temp_dir, ns=(0, 1))
+        self.assertEqual(completer.find_matches(head + "n", False), [head + "new.txt "])
+
+
+
+class TestDirectoryListings(unittest.TestCase):
+    def test_prefix_range(self):
+        names = ["grep", "grepx", "gzip", "ls"]
+        self.assertEqual(prefix_range(names, "grep"), (0, 2))
+        self.assertEqual(prefix_range(names, ""), (0, 4))
+        self.assertEqual(prefix_range(names, "z"), (4, 4))
+
+    def test_cache_is_bounded(self):
+        listings = DirectoryListings()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(DirectoryListings.MAX_LISTINGS + 1):
+                os.mkdir(os.path.join(temp_dir, str(i)))
+                listings.listing(os.path.join(temp_dir, str(i)))
+        self.assertLessEqual(len(listings.listings), DirectoryListings.MAX_LISTINGS)
+
+
+class TestMiniShellCompleter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.bin_dir = os.path.join(self.temp_dir, "bin")
+        os.makedirs(self.bin_dir)
+        for name in ("grep", "grepx", "gzip", "notexec"):
+            path = os.path.join(self.bin_dir, name)
+            with open(path, "w") as f:
+                f.write("#!/bin/sh\n")
+            os.chmod(path, 0o644 if name == "notexec" else 0o755)
+        self.shell = MiniShell(interactive=False)
+        self.shell.paths = [self.bin_dir]
+        self.shell.commands = self.shell.get_all_commands()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def complete(self, line, state):
+        begidx = line.rfind(" ") + 1
+        with patch("hp.readline.get_line_buffer", return_value=line), patch("hp.readline.get_begidx", return_value=begidx):
+            return self.shell.completer(line[begidx:], state)
+
+    def test_command_prefix(self):
+        self.assertEqual(self.shell.find_matches("gre", True), ["grep", "grepx"])
+        self.assertEqual(self.shell.find_matches("ec", True), ["echo"])
+        self.assertEqual(self.shell.find_matches("notex", True), [])
+
+    def test_path_completion(self):
+        os.makedirs(os.path.join(self.temp_dir, "docs"))
+        open(os.path.join(self.temp_dir, "data.txt"), "w").close()
+        open(os.path.join(self.temp_dir, ".hidden"), "w").close()
+        head = self.temp_dir + "/"
+        self.assertEqual(self.shell.find_matches(head + "d", False), [head + "data.txt", head + "docs/"])
+        self.assertEqual(self.shell.find_matches(head + ".", False), [head + ".hidden"])
+        open(os.path.join(self.temp_dir, "dx"), "w").close()
+        os.utime(self.temp_dir, ns=(0, 1))
+        self.assertEqual(len(self.shell.find_matches(head + "d", False)), 3)
+
+    def test_single_match_gets_a_space(self):
+        self.assertEqual(self.complete("ech", 0), "echo ")
+        self.assertIsNone(self.complete("ech", 1))
+
+    def test_ambiguous_prefix_lists_on_second_tab(self):
+        self.assertEqual(self.complete("grep", 0), "grep")
+        self.assertIsNone(self.complete("g", 0))
+        with patch("sys.stdout"):
+            self.assertEqual(self.complete("g", 0), "g")
+
+
+class TestJobTable(unittest.TestCase):
+    def test_background_job_status_and_specs(self):
+        jobs = JobTable()
+        self.assertEqual(jobs.launch(["sh", "-c", "exit 3"], "first", background=True), 0)
+        self.assertEqual(jobs.launch(["sleep", "0.1"], "second", background=True), 0)
+        self.assertEqual(jobs.find("%1").command, "first")
+        self.assertEqual(jobs.find("%+").command, "second")
+        self.assertEqual(jobs.find("%-").command, "first")
+        self.assertIsNone(jobs.find("%9"))
+        self.assertEqual(jobs.wait(jobs.find("%1")), 3)
+        self.assertEqual(list(jobs.jobs), [2])
+        self.assertTrue(jobs.format(jobs.jobs[2]).startswith("[2]+  Running"))
+        self.assertEqual(jobs.wait(jobs.jobs[2]), 0)
+        self.assertEqual(jobs.jobs, {})
+
+    def test_foreground_status(self):
+        jobs = JobTable()
+        self.assertEqual(jobs.launch("kill -TERM $$", "kill", background=False, shell=True), 143)
+
+
+class TestJobControl(unittest.TestCase):
+    def test_jobs_and_wait(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, "-c", "sleep 0.2 &\njobs\nwait\njobs")
+                self.assertEqual(result.stdout.splitlines(), ["[1]+  Running                 sleep 0.2 &"])
+                self.assertEqual(result.returncode, 0)
+
+    def test_wait_returns_the_job_status(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                self.assertEqual(run_shell(shell, "-c", "sh -c 'exit 7' &\nwait %1").returncode, 7)
+                # A job that finished lines earlier is still there to wait for.
+                self.assertEqual(run_shell(shell, "-c", "sh -c 'exit 7' &\nsleep 0.2\nwait %1").returncode, 7)
+                self.assertEqual(run_shell(shell, "-c", "wait %3").returncode, 127)
+
+    def test_pipeline_with_missing_stage_returns(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, "-c", "yes | nosuchcmd")
+                self.assertIn("nosuchcmd", result.stdout + result.stderr)
+                self.assertEqual(result.returncode, 127)
+
+    def test_script_reads_the_terminal(self):
+        # Without job control children stay in the shell's process group, so
+        # reading the controlling tty must not stop them with SIGTTIN.
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                pid, fd = pty.fork()
+                if pid == 0:
+                    os.execv(sys.executable, [sys.executable, SHELLS[shell], "-c", "cat"])
+                time.sleep(0.3)
+                os.write(fd, b"hi\n\x04")
+                output = b""
+                while True:
+                    try:
+                        chunk = os.read(fd, 1024)
+                    except OSError:
+                        break
+                    if not chunk:
+                        break
+                    output += chunk
+                _, status = os.waitpid(pid, 0)
+                os.close(fd)
+                self.assertNotIn(b"Stopped", output)
+                self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def test_bare_ampersand(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, "-c", "&\necho after")
+                self.assertEqual(result.stdout.splitlines(), ["syntax error near unexpected token `&'", "after"])
+                self.assertEqual(result.returncode, 0)
+                self.assertEqual(run_shell(shell, "-e", "-c", "&\necho after").returncode, 2)
+
+
+
+class TestScriptMode(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_command_string(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, "-c", "echo one\n# comment\n\necho two\nfalse")
+                self.assertEqual(result.stdout.splitlines(), ["one", "two"])
+                self.assertEqual(result.returncode, 1)
+
+    def test_script_file_and_stdin(self):
+        script = os.path.join(self.temp_dir, "script.sh")
+        with open(script, "w") as f:
+            f.write("echo from script\ntrue\n")
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, script)
+                self.assertEqual((result.stdout, result.returncode), ("from script\n", 0))
+                result = run_shell(shell, stdin="echo from stdin\n")
+                self.assertEqual((result.stdout, result.returncode), ("from stdin\n", 0))
+                self.assertEqual(run_shell(shell, os.path.join(self.temp_dir, "missing")).returncode, 127)
+
+    def test_errexit(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, "-c", "echo a\nfalse\necho b")
+                self.assertEqual(result.stdout.splitlines(), ["a", "b"])
+                result = run_shell(shell, "-e", "-c", "echo a\nfalse\necho b")
+                self.assertEqual((result.stdout, result.returncode), ("a\n", 1))
+                result = run_shell(shell, "-c", "set -e\nset +e\nfalse\nset -e\necho b\nfalse\necho c")
+                self.assertEqual((result.stdout, result.returncode), ("b\n", 1))
+
+    def test_exit_status(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, "-c", "exit 3\necho unreachable")
+                self.assertEqual((result.stdout, result.returncode), ("", 3))
+                self.assertEqual(run_shell(shell, "-c", "exit 258").returncode, 2)
+                self.assertEqual(run_shell(shell, "-c", "exit nope").returncode, 2)
+
+    def test_unparsable_line(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                result = run_shell(shell, "-c", 'echo "x\necho after')
+                self.assertIn("No closing quotation", result.stderr)
+                self.assertEqual((result.stdout, result.returncode), ("after\n", 0))
+                result = run_shell(shell, "-e", "-c", 'echo "x\necho after')
+                self.assertEqual((result.stdout, result.returncode), ("", 2))
+
+    def test_timing_trace(self):
+        for shell in SHELLS:
+            with self.subTest(shell=shell):
+                trace = os.path.join(self.temp_dir, f"{shell}.jsonl")
+                run_shell(shell, "-t", trace, "-c", "echo hi\nsh -c 'exit 4'")
+                with open(trace) as f:
+                    entries = [json.loads(line) for line in f]
+                self.assertEqual([(e["command"], e["status"]) for e in entries],
+                                 [("echo hi", 0), ("sh -c 'exit 4'", 4)])
+                for entry in entries:
+                    self.assertEqual(set(entry), {"command", "status", "wall", "cpu", "children_cpu"})
+                    self.assertGreaterEqual(entry["wall"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
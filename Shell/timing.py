@@ -0,0 +1,28 @@
+import os
+import sys
+import json
+import time
+
+
+class TimingTrace:
+    """Appends one JSON line per command with its wall and CPU time."""
+
+    def __init__(self, path: str):
+        self.file = sys.stderr if path == "-" else open(os.path.expanduser(path), "a")
+
+    @staticmethod
+    def start() -> tuple[float, os.times_result]:
+        return time.perf_counter(), os.times()
+
+    def record(self, command: str, started: tuple[float, os.times_result], status: int) -> None:
+        wall, before = started
+        wall = time.perf_counter() - wall
+        after = os.times()
+        cpu = (after.user - before.user) + (after.system - before.system)
+        children = (after.children_user - before.children_user) + (after.children_system - before.children_system)
+        entry = {"command": command, "status": status, "wall": round(wall, 6), "cpu": round(cpu, 6), "children_cpu": round(children, 6)}
+        self.file.write(json.dumps(entry) + "\n")
+
+    def close(self) -> None:
+        if self.file is not sys.stderr:
+            self.file.close()